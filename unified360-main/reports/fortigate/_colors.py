@@ -0,0 +1,37 @@
+# reports/fortigate/_colors.py
+"""
+Shared colour constants for the Fortigate PDF reports (1008 VPN, 1009 SD-WAN).
+Built once at import so report builds don't re-parse hex strings.
+"""
+from reportlab.lib.colors import HexColor
+
+# ---------------------------
+# VPN report (pdf_1008)
+# ---------------------------
+BANNER_BG = HexColor("#0052CC")
+KPI_TOTAL_BG = HexColor("#E8F4FF")
+KPI_UP_BG = HexColor("#C8FFC8")
+TABLE_HEADER_BG = HexColor("#EEF3FF")
+TOP10_GRID = HexColor("#D2D7E0")
+DETAIL_GRID = HexColor("#CCD2DB")
+
+UP_BG = HexColor("#CCFFCC")
+DOWN_BG = HexColor("#FFCCCC")
+WARN_BG = HexColor("#FFE6B3")
+NEUTRAL_BG = HexColor("#EDEDED")
+
+# ---------------------------
+# SD-WAN report (pdf_1009)
+# ---------------------------
+SDWAN_PRIMARY_BG = HexColor("#003A63")  # deep blue
+SDWAN_HEADER_BG = HexColor("#004e92")
+SDWAN_ACCENT = HexColor("#00d4ff")
+SDWAN_GRID = HexColor("#d6d6d6")
+SDWAN_ROW_ALT = HexColor("#fbfbfb")
+SDWAN_DOWN_ROW_ALT = HexColor("#fffafa")
+
+LIGHT_ORANGE = HexColor("#ffb74d")
+AMBER = HexColor("#ff8f00")
+DARK_AMBER = HexColor("#d97b00")
+RED = HexColor("#c62828")
+DARK_RED = HexColor("#9b1d08")
@@ -0,0 +1,23 @@
+# reports/fortigate/_tables.py
+"""
+Table-style helpers shared by the Fortigate PDF reports (1008 VPN, 1009 SD-WAN).
+"""
+
+
+def cell_color_commands(rows, col_rules, command="BACKGROUND", start=1):
+    """
+    Build per-cell colour commands for a table body in one flat list.
+
+    rows:      body rows (header excluded)
+    col_rules: {col_index: fn(cell_value) -> colour or None}
+    command:   TableStyle command to emit ("BACKGROUND" / "TEXTCOLOR")
+    start:     table row index of rows[0] (1 when row 0 is the header)
+    """
+    rules = tuple(col_rules.items())
+    return [
+        (command, (c, i), (c, i), colour)
+        for i, row in enumerate(rows, start)
+        for c, rule in rules
+        for colour in (rule(row[c]),)
+        if colour is not None
+    ]
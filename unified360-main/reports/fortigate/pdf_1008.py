@@ -1,6 +1,8 @@
 # reports/fortigate/pdf_1008.py
 
+import io
 import os
+import heapq
 import tempfile
 from datetime import datetime, timezone, timedelta
 import math
@@ -10,24 +12,33 @@ from reportlab.lib import colors
 from reportlab.lib.pagesizes import landscape, A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import mm
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.platypus import (
-    SimpleDocTemplate, Paragraph, Table, TableStyle, Spacer, Image, PageBreak
+    SimpleDocTemplate, Paragraph, Table, LongTable, TableStyle, Spacer, Image
 )
 
+from ._colors import (
+    BANNER_BG, KPI_TOTAL_BG, KPI_UP_BG, TABLE_HEADER_BG, TOP10_GRID, DETAIL_GRID,
+    UP_BG, DOWN_BG, WARN_BG, NEUTRAL_BG,
+)
+from ._tables import cell_color_commands
+
 IST = timezone(timedelta(hours=5, minutes=30))
 
 
 # ===================================================================
 # Utility Helpers
 # ===================================================================
+_BYTE_UNITS = ("KB", "MB", "GB", "TB")
+
+
 def _secs_to_rounded_human(s):
     if not s or s <= 0:
         return "0 min"
     minutes = int(round(s / 60.0))
     if minutes < 60:
         return f"{minutes} min"
-    h = minutes // 60
-    r = minutes % 60
+    h, r = divmod(minutes, 60)
     if r == 0:
         return f"{h} hr"
     return f"{h} hr {r} min"
@@ -43,36 +54,31 @@ def _human_bytes_auto(b):
 
     if b < 1024:
         return f"{int(b)} B"
-    kb = b / 1024
-    if kb < 1024:
-        return f"{kb:.2f} KB"
-    mb = kb / 1024
-    if mb < 1024:
-        return f"{mb:.2f} MB"
-    gb = mb / 1024
-    if gb < 1024:
-        return f"{gb:.2f} GB"
-    tb = gb / 1024
-    return f"{tb:.2f} TB"
-
-
-def _parse_bytes_for_sort(s):
-    if not isinstance(s, str):
-        return 0
-    try:
-        if s.endswith(" TB"):
-            return float(s[:-3]) * 1024 ** 4
-        if s.endswith(" GB"):
-            return float(s[:-3]) * 1024 ** 3
-        if s.endswith(" MB"):
-            return float(s[:-3]) * 1024 ** 2
-        if s.endswith(" KB"):
-            return float(s[:-3]) * 1024
-        if s.endswith(" B"):
-            return float(s[:-2])
-        return float(s)
-    except:
-        return 0
+    # walk the unit ladder once; TB is the ceiling
+    for unit in _BYTE_UNITS:
+        b /= 1024
+        if b < 1024:
+            break
+    return f"{b:.2f} {unit}"
+
+
+UP = "UP"
+DOWN = "DOWN"
+
+_STATUS_BG = {UP: UP_BG, DOWN: DOWN_BG}
+
+
+def _status_bg(s):
+    return _STATUS_BG.get(s, NEUTRAL_BG)
+
+
+def _availability_bg(cell):
+    pct = float(cell.replace("%", ""))
+    if pct < 50:
+        return DOWN_BG
+    if pct < 75:
+        return WARN_BG
+    return UP_BG
 
 
 # ===================================================================
@@ -177,12 +183,11 @@ def _fetch_volume_deltas(device, start_iso, end_iso):
 # ===================================================================
 # Header Block
 # ===================================================================
-def _add_header(story, device, start_iso, end_iso, interval, total, up, down):
+def _add_header(story, device, start_dt, end_dt, interval, total, up, down):
     styles = getSampleStyleSheet()
-    blue = colors.HexColor("#0052CC")
 
-    start_ist = datetime.fromisoformat(start_iso.replace("Z", "+00:00")).astimezone(IST)
-    end_ist = datetime.fromisoformat(end_iso.replace("Z", "+00:00")).astimezone(IST)
+    start_ist = start_dt.astimezone(IST)
+    end_ist = end_dt.astimezone(IST)
 
     # logo
     logo_path = os.path.join(current_app.root_path, "static/img/autointelli.png")
@@ -207,7 +212,7 @@ def _add_header(story, device, start_iso, end_iso, interval, total, up, down):
     )
 
     t.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, -1), blue),
+        ("BACKGROUND", (0, 0), (-1, -1), BANNER_BG),
         ("TEXTCOLOR", (0, 0), (-1, -1), colors.white),
         ("SPAN", (1, 0), (1, 0)),
         ("LEFTPADDING", (0, 0), (-1, -1), 10),
@@ -223,9 +228,9 @@ def _add_header(story, device, start_iso, end_iso, interval, total, up, down):
     ], colWidths=[80 * mm, 50 * mm, 50 * mm])
 
     k.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (0, 0), colors.HexColor("#E8F4FF")),
-        ("BACKGROUND", (1, 0), (1, 0), colors.HexColor("#C8FFC8")),
-        ("BACKGROUND", (2, 0), (2, 0), colors.HexColor("#FFCCCC")),
+        ("BACKGROUND", (0, 0), (0, 0), KPI_TOTAL_BG),
+        ("BACKGROUND", (1, 0), (1, 0), KPI_UP_BG),
+        ("BACKGROUND", (2, 0), (2, 0), DOWN_BG),
         ("FONTNAME", (0, 0), (-1, -1), "Helvetica-Bold"),
     ]))
 
@@ -236,14 +241,21 @@ def _add_header(story, device, start_iso, end_iso, interval, total, up, down):
 # ===================================================================
 # Main PDF Builder
 # ===================================================================
-def build_pdf(device, start, end, interval):
+def build_pdf(device, start, end, interval, start_dt=None, end_dt=None):
+    """
+    start/end: UTC ISO strings used in the Influx queries.
+    start_dt/end_dt: the same instants as aware datetimes, when the caller
+    already has them (rpt_1008 does) — saves re-parsing the strings.
+    """
     out_file = os.path.join(
         tempfile.gettempdir(),
         f"rpt_1008_fortigate_{device}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.pdf"
     )
 
+    # render in memory, then publish the finished file in one write + rename
+    buf = io.BytesIO()
     doc = SimpleDocTemplate(
-        out_file,
+        buf,
         pagesize=landscape(A4),
         leftMargin=10 * mm,      # <<< wider margin
         rightMargin=10 * mm,     # <<< wider margin
@@ -263,8 +275,10 @@ def build_pdf(device, start, end, interval):
         t["out_delta"] = d["out_delta"]
 
     # availability calc
-    start_dt = datetime.fromisoformat(start.replace("Z", "+00:00"))
-    end_dt = datetime.fromisoformat(end.replace("Z", "+00:00"))
+    if start_dt is None:
+        start_dt = datetime.fromisoformat(start.replace("Z", "+00:00"))
+    if end_dt is None:
+        end_dt = datetime.fromisoformat(end.replace("Z", "+00:00"))
     duration = max(1, (end_dt - start_dt).total_seconds())
 
     for t in tunnels:
@@ -272,11 +286,17 @@ def build_pdf(device, start, end, interval):
         t["availability_pct"] = min(max(pct, 0), 100)
 
     total = len(tunnels)
-    up_count = sum(1 for t in tunnels if t["status_code"] == 2)
-    down_count = sum(1 for t in tunnels if t["status_code"] == 1)
+    up_count = 0
+    down_count = 0
+    for t in tunnels:
+        code = t["status_code"]
+        if code == 2:
+            up_count += 1
+        elif code == 1:
+            down_count += 1
 
     # header
-    _add_header(story, device, start, end, interval, total, up_count, down_count)
+    _add_header(story, device, start_dt, end_dt, interval, total, up_count, down_count)
 
 
     # ======================================================================
@@ -290,8 +310,8 @@ def build_pdf(device, start, end, interval):
         col_widths = [98, 45, 110, 98, 75, 75]
 
         tbl = Table(rows, colWidths=col_widths, repeatRows=1)
-        tbl.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#EEF3FF")),
+        cmds = [
+            ("BACKGROUND", (0, 0), (-1, 0), TABLE_HEADER_BG),
             ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
             ("FONTSIZE", (0, 0), (-1, 0), 9),
             ("FONTSIZE", (0, 1), (-1, -1), 8),        # <<< increased from 7.5
@@ -299,87 +319,74 @@ def build_pdf(device, start, end, interval):
             ("RIGHTPADDING", (0, 0), (-1, -1), 2),
             ("TOPPADDING", (0, 0), (-1, -1), 2),      # <<< increased padding
             ("BOTTOMPADDING", (0, 0), (-1, -1), 2),   # <<< increased padding
-            ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#D2D7E0")),
+            ("GRID", (0, 0), (-1, -1), 0.25, TOP10_GRID),
             ("ALIGN", (3, 1), (-1, -1), "RIGHT")
-        ]))
+        ]
 
         # apply coloring
-        dyn = []
-        for i, row in enumerate(rows[1:], start=1):
-            if status_index is not None:
-                s = row[status_index]
-                if s == "UP":
-                    dyn.append(("BACKGROUND", (status_index, i), (status_index, i), colors.HexColor("#CCFFCC")))
-                elif s == "DOWN":
-                    dyn.append(("BACKGROUND", (status_index, i), (status_index, i), colors.HexColor("#FFCCCC")))
-                else:
-                    dyn.append(("BACKGROUND", (status_index, i), (status_index, i), colors.HexColor("#EDEDED")))
-
-            if availability_index is not None:
-                pct = float(row[availability_index].replace("%", ""))
-                if pct < 50:
-                    dyn.append(("BACKGROUND", (availability_index, i), (availability_index, i), colors.HexColor("#FFCCCC")))
-                elif pct < 75:
-                    dyn.append(("BACKGROUND", (availability_index, i), (availability_index, i), colors.HexColor("#FFE6B3")))
-                else:
-                    dyn.append(("BACKGROUND", (availability_index, i), (availability_index, i), colors.HexColor("#CCFFCC")))
-
-        tbl.setStyle(TableStyle(dyn))
+        col_rules = {}
+        if status_index is not None:
+            col_rules[status_index] = _status_bg
+        if availability_index is not None:
+            col_rules[availability_index] = _availability_bg
+        cmds.extend(cell_color_commands(rows[1:], col_rules))
+
+        tbl.setStyle(TableStyle(cmds))
         story.append(tbl)
         story.append(Spacer(1, 6 * mm))
 
 
     # ---- Top 10 In
-    t10 = sorted(tunnels, key=lambda x: -x["in_delta"])[:10]
+    t10 = heapq.nlargest(10, tunnels, key=lambda x: x["in_delta"])
     rows = [["VPN Name", "Status", "Uptime", "In Volume", "Out Volume"]]
     for t in t10:
-        rows.append([
+        rows.append((
             t["vpn_name"],
-            "UP" if t["status_code"] == 2 else "DOWN",
+            UP if t["status_code"] == 2 else DOWN,
             _secs_to_rounded_human(t["life_secs"]),
             _human_bytes_auto(t["in_delta"]),
             _human_bytes_auto(t["out_delta"])
-        ])
+        ))
     build_top10("Top 10 Tunnels — In Volume", rows, rows[0], status_index=1)
 
     # ---- Top 10 Out
-    t10 = sorted(tunnels, key=lambda x: -x["out_delta"])[:10]
+    t10 = heapq.nlargest(10, tunnels, key=lambda x: x["out_delta"])
     rows = [["VPN Name", "Status", "Uptime", "Out Volume", "In Volume"]]
     for t in t10:
-        rows.append([
+        rows.append((
             t["vpn_name"],
-            "UP" if t["status_code"] == 2 else "DOWN",
+            UP if t["status_code"] == 2 else DOWN,
             _secs_to_rounded_human(t["life_secs"]),
             _human_bytes_auto(t["out_delta"]),
             _human_bytes_auto(t["in_delta"])
-        ])
+        ))
     build_top10("Top 10 Tunnels — Out Volume", rows, rows[0], status_index=1)
 
     # ---- Top 10 Uptime
-    t10 = sorted(tunnels, key=lambda x: -x["life_secs"])[:10]
+    t10 = heapq.nlargest(10, tunnels, key=lambda x: x["life_secs"])
     rows = [["VPN Name", "Status", "Uptime", "In Volume", "Out Volume"]]
     for t in t10:
-        rows.append([
+        rows.append((
             t["vpn_name"],
-            "UP" if t["status_code"] == 2 else "DOWN",
+            UP if t["status_code"] == 2 else DOWN,
             _secs_to_rounded_human(t["life_secs"]),
             _human_bytes_auto(t["in_delta"]),
             _human_bytes_auto(t["out_delta"])
-        ])
+        ))
     build_top10("Top 10 Tunnels — Uptime", rows, rows[0], status_index=1)
 
     # ---- Top 10 Worst Availability
-    t10 = sorted(tunnels, key=lambda x: x["availability_pct"])[:10]
+    t10 = heapq.nsmallest(10, tunnels, key=lambda x: x["availability_pct"])
     rows = [["VPN Name", "Status", "Availability %", "Uptime", "In Volume", "Out Volume"]]
     for t in t10:
-        rows.append([
+        rows.append((
             t["vpn_name"],
-            "UP" if t["status_code"] == 2 else "DOWN",
+            UP if t["status_code"] == 2 else DOWN,
             f"{t['availability_pct']:.1f}%",
             _secs_to_rounded_human(t["life_secs"]),
             _human_bytes_auto(t["in_delta"]),
             _human_bytes_auto(t["out_delta"])
-        ])
+        ))
     build_top10("Top 10 — Worst Availability", rows, rows[0], status_index=1, availability_index=2)
 
 
@@ -397,59 +404,65 @@ def build_pdf(device, start, end, interval):
 
     small_style = ParagraphStyle("S", fontSize=8, leading=9.8)  # <<< larger font
 
+    # only pay for a Paragraph when the text actually needs wrapping;
+    # usable width = column width minus left/right cell padding
+    def _cell(text, width):
+        if stringWidth(text, small_style.fontName, small_style.fontSize) <= width - 5:
+            return text
+        return Paragraph(text, small_style)
+
+    # sort on the raw numbers before formatting: UP first, then In volume desc
+    ordered = sorted(tunnels, key=lambda t: (t["status_code"] != 2, -t["in_delta"]))
+
     # build rows
-    drows = []
-    for t in tunnels:
-        drows.append([
-            Paragraph(t["vpn_name"], small_style),
-            "UP" if t["status_code"] == 2 else "DOWN",
-            Paragraph(t["phase2"], small_style),
-            Paragraph(t["remote_gw"], small_style),
+    drows = [
+        (
+            _cell(t["vpn_name"], col_widths[0]),
+            UP if t["status_code"] == 2 else DOWN,
+            _cell(t["phase2"], col_widths[2]),
+            _cell(t["remote_gw"], col_widths[3]),
             _secs_to_rounded_human(t["life_secs"]),
             _human_bytes_auto(t["in_delta"]),
             _human_bytes_auto(t["out_delta"])
-        ])
-
-    # sort: UP first
-    drows = sorted(drows, key=lambda r: (0 if r[1] == "UP" else 1, -_parse_bytes_for_sort(r[5])))
-
-    per_page = 26
-    idx = 0
-    total_rows = len(drows)
-
-    while idx < total_rows:
-        chunk = [header] + drows[idx:idx + per_page]
-
-        tbl = Table(chunk, colWidths=col_widths, repeatRows=1)
-        style = [
-            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#EEF3FF")),
-            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("FONTSIZE", (0, 0), (-1, 0), 9),
-            ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#CCD2DB")),
-            ("LEFTPADDING", (0, 0), (-1, -1), 3),
-            ("RIGHTPADDING", (0, 0), (-1, -1), 2),
-            ("TOPPADDING", (0, 0), (-1, -1), 2),    # <<< bigger padding
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
-            ("ALIGN", (5, 1), (-1, -1), "RIGHT")
-        ]
-
-        # status color
-        dyn = []
-        for r_idx, row in enumerate(chunk[1:], start=1):
-            if row[1] == "UP":
-                dyn.append(("BACKGROUND", (1, r_idx), (1, r_idx), colors.HexColor("#CCFFCC")))
-            elif row[1] == "DOWN":
-                dyn.append(("BACKGROUND", (1, r_idx), (1, r_idx), colors.HexColor("#FFCCCC")))
-            else:
-                dyn.append(("BACKGROUND", (1, r_idx), (1, r_idx), colors.HexColor("#EDEDED")))
-
-        tbl.setStyle(TableStyle(style + dyn))
-        story.append(tbl)
-
-        idx += per_page
-        if idx < total_rows:
-            story.append(PageBreak())
+        )
+        for t in ordered
+    ]
+
+    # one LongTable; platypus splits it across pages and repeats the header
+    tbl = LongTable([header] + drows, colWidths=col_widths, repeatRows=1)
+    style = [
+        ("BACKGROUND", (0, 0), (-1, 0), TABLE_HEADER_BG),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTSIZE", (0, 0), (-1, 0), 9),
+        ("FONTSIZE", (0, 1), (0, -1), 8),       # plain-text name/phase2/gw cells
+        ("FONTSIZE", (2, 1), (3, -1), 8),       # match the Paragraph style
+        ("GRID", (0, 0), (-1, -1), 0.25, DETAIL_GRID),
+        ("LEFTPADDING", (0, 0), (-1, -1), 3),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 2),
+        ("TOPPADDING", (0, 0), (-1, -1), 2),    # <<< bigger padding
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
+        ("ALIGN", (5, 1), (-1, -1), "RIGHT")
+    ]
+
+    # status color: drows are sorted UP-first, so the column is at most one
+    # UP run (up_count rows) followed by one DOWN run (absolute row indices;
+    # header is row 0)
+    n = len(drows)
+    split = up_count
+    dyn = []
+    if split:
+        dyn.append(("BACKGROUND", (1, 1), (1, split), UP_BG))
+    if split < n:
+        dyn.append(("BACKGROUND", (1, split + 1), (1, n), DOWN_BG))
+
+    tbl.setStyle(TableStyle(style + dyn))
+    story.append(tbl)
 
     doc.build(story)
+
+    tmp_file = out_file + ".part"
+    with open(tmp_file, "wb") as f:
+        f.write(buf.getbuffer())
+    os.replace(tmp_file, out_file)
     return out_file
 
@@ -6,15 +6,24 @@ from reportlab.lib.pagesizes import landscape, A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.lib.units import mm
+from bisect import bisect_left, bisect_right
 from datetime import datetime
+from operator import itemgetter
+import io
 import os
 
+from ._colors import (
+    SDWAN_PRIMARY_BG, SDWAN_HEADER_BG, SDWAN_ACCENT, SDWAN_GRID, SDWAN_ROW_ALT,
+    SDWAN_DOWN_ROW_ALT, LIGHT_ORANGE, AMBER, DARK_AMBER, RED, DARK_RED,
+)
+from ._tables import cell_color_commands
+
 styles = getSampleStyleSheet()
 
 # Enterprise colours (matching the VPN sample)
-PRIMARY_BG = colors.HexColor("#003A63")  # deep blue
-HEADER_BG = colors.HexColor("#004e92")
-ACCENT = colors.HexColor("#00d4ff")
+PRIMARY_BG = SDWAN_PRIMARY_BG  # deep blue
+HEADER_BG = SDWAN_HEADER_BG
+ACCENT = SDWAN_ACCENT
 
 title_style = ParagraphStyle(
     "Title",
@@ -53,6 +62,17 @@ logo_path = os.path.join("static", "img", "autointelli.png")  # keep this relati
 # Helpers
 # ---------------------------
 
+# (divisor, label) ladder for human_bw, largest first
+_BW_UNITS = ((1_000_000_000, "GB"), (1_000_000, "MB"), (1_000, "KB"))
+
+# rows are normalized by rpt_1009._normalize_row, so every key is present;
+# one itemgetter call per row instead of a dict.get() per cell
+_SMALL_FIELDS = itemgetter("link_name", "latency_ms", "jitter_ms", "packet_loss", "status")
+_DETAIL_FIELDS = itemgetter("link_name", "ifname", "latency_ms", "jitter_ms", "packet_loss", "status")
+_DOWN_FIELDS = itemgetter("link_name", "ifname", "packet_loss", "status")
+_BW_FIELDS = ("bandwidth_in", "bandwidth_out", "used_bandwidth_in", "used_bandwidth_out")
+
+
 def human_bw(v):
     """
     Convert raw bandwidth number (dynamic based on value)
@@ -73,15 +93,18 @@ def human_bw(v):
     # Use thresholds and show appropriate unit labels (GB/MB/KB)
     # We'll assume the raw value represents bytes/seconds or bytes total — user requested dynamic formatting
     # Show in bytes-based units (B / KB / MB / GB)
-    if abs(v) >= 1_000_000_000:
-        return f"{v / 1_000_000_000:.2f} GB"
-    if abs(v) >= 1_000_000:
-        return f"{v / 1_000_000:.2f} MB"
-    if abs(v) >= 1_000:
-        return f"{v / 1_000:.2f} KB"
+    a = abs(v)
+    for limit, unit in _BW_UNITS:
+        if a >= limit:
+            return f"{v / limit:.2f} {unit}"
     return f"{v:.0f} B"
 
 
+def human_bw_column(values):
+    """Format a whole column of raw bandwidth numbers with human_bw()."""
+    return list(map(human_bw, values))
+
+
 def short_time(ts):
     """Return human friendly time if present, or blank"""
     if not ts:
@@ -99,18 +122,32 @@ def short_time(ts):
 # Colour rules
 # ---------------------------
 
+# threshold ladders, ascending; index from bisect selects the colour
+_LAT_THRESH = (250, 500, 1000)
+_LAT_COLORS = (None, LIGHT_ORANGE, AMBER, RED)
+_LOSS_THRESH = (5, 25, 50, 75)
+_LOSS_COLORS = (None, LIGHT_ORANGE, AMBER, DARK_AMBER, DARK_RED)
+
+
+def _lat_color_num(v: float):
+    # strictly greater than the threshold
+    return _LAT_COLORS[bisect_left(_LAT_THRESH, v)]
+
+
+def _loss_color_num(v: float):
+    if v != v:
+        # NaN: bisect_right would place it past the last threshold
+        return None
+    # greater than or equal to the threshold
+    return _LOSS_COLORS[bisect_right(_LOSS_THRESH, v)]
+
+
 def latency_color(val):
     try:
         v = float(val)
     except Exception:
         return None
-    if v > 1000:
-        return colors.HexColor("#c62828")  # red
-    if v > 500:
-        return colors.HexColor("#ff8f00")  # amber
-    if v > 250:
-        return colors.HexColor("#ffb74d")  # light orange
-    return None
+    return _lat_color_num(v)
 
 
 def loss_color(val):
@@ -118,15 +155,7 @@ def loss_color(val):
         v = float(val)
     except Exception:
         return None
-    if v >= 75:
-        return colors.HexColor("#9b1d08")
-    if v >= 50:
-        return colors.HexColor("#d97b00")
-    if v >= 25:
-        return colors.HexColor("#ff8f00")
-    if v >= 5:
-        return colors.HexColor("#ffb74d")
-    return None
+    return _loss_color_num(v)
 
 
 def state_color(state):
@@ -142,43 +171,40 @@ def build_small_table(title, rows, col_widths=None):
         col_widths = [70*mm, 25*mm, 25*mm, 30*mm, 20*mm]
 
     data = [["Link Name", "Latency(ms)", "Jitter(ms)", "Packet Loss(%)", "State"]]
-    for r in rows:
-        data.append([
-            r.get("link_name", ""),
-            f"{r.get('latency_ms', 0):.2f}",
-            f"{r.get('jitter_ms', 0):.2f}",
-            f"{r.get('packet_loss', 0):.2f}",
-            r.get("status", "UP"),
-        ])
+    # keep the raw (float) fields; colour rules read these, not the formatted cells
+    fields = list(map(_SMALL_FIELDS, rows))
+    for name, lat, jit, loss, status in fields:
+        data.append((
+            name,
+            f"{lat:.2f}",
+            f"{jit:.2f}",
+            f"{loss:.2f}",
+            status,
+        ))
 
     table = Table(data, colWidths=col_widths)
-    ts = TableStyle([
+    cmds = [
         ("BACKGROUND", (0, 0), (-1, 0), HEADER_BG),
         ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
         ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
         ("FONTSIZE", (0, 0), (-1, -1), 8),
         ("ALIGN", (1, 1), (-2, -1), "CENTER"),
         ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#d6d6d6")),
+        ("GRID", (0, 0), (-1, -1), 0.25, SDWAN_GRID),
         # alternate row backgrounds
         ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.whitesmoke, colors.white]),
         ("LEFTPADDING", (0, 0), (-1, -1), 4),
         ("RIGHTPADDING", (0, 0), (-1, -1), 4),
         ("TOPPADDING", (0, 0), (-1, -1), 3),
         ("BOTTOMPADDING", (0, 0), (-1, -1), 3),
-    ])
+    ]
 
     # apply dynamic colors
-    for i in range(1, len(data)):
-        lat_col = latency_color(float(data[i][1]))
-        if lat_col:
-            ts.add("TEXTCOLOR", (1, i), (1, i), lat_col)
-        loss_col = loss_color(float(data[i][3]))
-        if loss_col:
-            ts.add("TEXTCOLOR", (3, i), (3, i), loss_col)
-        ts.add("TEXTCOLOR", (4, i), (4, i), state_color(data[i][4]))
-
-    table.setStyle(ts)
+    cmds.extend(cell_color_commands(
+        fields, {1: _lat_color_num, 3: _loss_color_num, 4: state_color}, command="TEXTCOLOR"
+    ))
+
+    table.setStyle(TableStyle(cmds))
     return [Paragraph(title, section_style), table, Spacer(1, 6)]
 
 
@@ -194,19 +220,24 @@ def build_detailed_table(rows):
     ]
     data = [headers]
 
-    for r in rows:
-        data.append([
-            r.get("link_name", ""),
-            r.get("ifname", ""),
-            f"{r.get('latency_ms', 0):.2f}",
-            f"{r.get('jitter_ms', 0):.2f}",
-            f"{r.get('packet_loss', 0):.2f}",
-            r.get("status", "UP"),
-            human_bw(r.get("bandwidth_in", 0)),
-            human_bw(r.get("bandwidth_out", 0)),
-            human_bw(r.get("used_bandwidth_in", 0)),
-            human_bw(r.get("used_bandwidth_out", 0)),
-        ])
+    # format the four bandwidth columns column-wise, then stitch rows together
+    bw_cols = [
+        human_bw_column(list(map(itemgetter(k), rows)))
+        for k in _BW_FIELDS
+    ]
+
+    # keep the raw (float) fields; colour rules read these, not the formatted cells
+    fields = list(map(_DETAIL_FIELDS, rows))
+    for (name, ifname, lat, jit, loss, status), bw in zip(fields, zip(*bw_cols)):
+        data.append((
+            name,
+            ifname,
+            f"{lat:.2f}",
+            f"{jit:.2f}",
+            f"{loss:.2f}",
+            status,
+            *bw,
+        ))
 
     # use compact but readable widths, landscape A4
     col_widths = [
@@ -216,45 +247,27 @@ def build_detailed_table(rows):
 
     table = Table(data, colWidths=col_widths, repeatRows=1)
 
-    ts = TableStyle([
+    cmds = [
         ("BACKGROUND", (0, 0), (-1, 0), HEADER_BG),
         ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
         ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
         ("FONTSIZE", (0, 0), (-1, -1), 8),
         ("ALIGN", (2, 1), (-1, -1), "CENTER"),
         ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#d6d6d6")),
-        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#fbfbfb")]),
+        ("GRID", (0, 0), (-1, -1), 0.25, SDWAN_GRID),
+        ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, SDWAN_ROW_ALT]),
         ("LEFTPADDING", (0, 0), (-1, -1), 4),
         ("RIGHTPADDING", (0, 0), (-1, -1), 4),
         ("TOPPADDING", (0, 0), (-1, -1), 2),
         ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
-    ])
+    ]
 
     # apply color rules on numeric columns (latency col index 2, packet loss index 4, state index 5)
-    for i in range(1, len(data)):
-        # latency
-        try:
-            lat_val = float(data[i][2])
-            c = latency_color(lat_val)
-            if c:
-                ts.add("TEXTCOLOR", (2, i), (2, i), c)
-        except Exception:
-            pass
-
-        # packet loss (data stored as string like "12.34")
-        try:
-            loss_val = float(data[i][4])
-            c = loss_color(loss_val)
-            if c:
-                ts.add("TEXTCOLOR", (4, i), (4, i), c)
-        except Exception:
-            pass
-
-        # state
-        ts.add("TEXTCOLOR", (5, i), (5, i), state_color(data[i][5]))
+    cmds.extend(cell_color_commands(
+        fields, {2: _lat_color_num, 4: _loss_color_num, 5: state_color}, command="TEXTCOLOR"
+    ))
 
-    table.setStyle(ts)
+    table.setStyle(TableStyle(cmds))
 
     return [Paragraph("Detailed SD-WAN Link Table", section_style), Spacer(1, 4), table]
 
@@ -265,6 +278,7 @@ def build_detailed_table(rows):
 
 def build_header(meta):
     elems = []
+    generated = datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')
     # Try to include logo (if exists)
     if os.path.exists(logo_path):
         try:
@@ -272,7 +286,7 @@ def build_header(meta):
             # place logo and title side by side using a small table
             title = Paragraph(f"<b>Fortigate SD-WAN Performance Report</b>", title_style)
             meta_text = Paragraph(
-                f"Device: <b>{meta.get('device','')}</b> | Range: {meta.get('start','')} → {meta.get('end','')} | Generated: {datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')}",
+                f"Device: <b>{meta.get('device','')}</b> | Range: {meta.get('start','')} → {meta.get('end','')} | Generated: {generated}",
                 meta_style
             )
             header_table = Table([
@@ -294,7 +308,7 @@ def build_header(meta):
     elems.append(Paragraph(f"<b>Fortigate SD-WAN Performance Report</b>", title_style))
     elems.append(Spacer(1, 6))
     elems.append(Paragraph(
-        f"Device: <b>{meta.get('device','')}</b> | Range: {meta.get('start','')} → {meta.get('end','')} | Generated: {datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')}",
+        f"Device: <b>{meta.get('device','')}</b> | Range: {meta.get('start','')} → {meta.get('end','')} | Generated: {generated}",
         meta_style
     ))
     elems.append(Spacer(1, 6))
@@ -342,21 +356,21 @@ def build_pdf(outfile, meta, top_latency, top_jitter, top_packet_loss, up_links,
     if down_links:
         # show short down links summary
         down_data = [["Link Name", "IfName", "Packet Loss(%)", "State"]]
-        for r in down_links:
-            down_data.append([
-                r.get("link_name", ""),
-                r.get("ifname", ""),
-                f"{r.get('packet_loss', 0):.2f}",
-                r.get("status", "DOWN")
-            ])
+        for name, ifname, loss, status in map(_DOWN_FIELDS, down_links):
+            down_data.append((
+                name,
+                ifname,
+                f"{loss:.2f}",
+                status
+            ))
         down_table = Table(down_data, colWidths=[70*mm, 35*mm, 30*mm, 20*mm])
         down_table.setStyle(TableStyle([
             ("BACKGROUND", (0, 0), (-1, 0), HEADER_BG),
             ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
             ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
             ("FONTSIZE", (0, 0), (-1, -1), 8),
-            ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#d6d6d6")),
-            ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#fffafa")]),
+            ("GRID", (0, 0), (-1, -1), 0.25, SDWAN_GRID),
+            ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, SDWAN_DOWN_ROW_ALT]),
         ]))
         story.append(Paragraph("Down Links", section_style))
         story.append(down_table)
@@ -365,9 +379,10 @@ def build_pdf(outfile, meta, top_latency, top_jitter, top_packet_loss, up_links,
     # Detailed table (UP + DOWN)
     story += build_detailed_table(all_rows)
 
-    # write PDF
+    # write PDF: render in memory, then publish in one write + rename
+    buf = io.BytesIO()
     doc = SimpleDocTemplate(
-        outfile,
+        buf,
         pagesize=landscape(A4),
         leftMargin=12,
         rightMargin=12,
@@ -376,3 +391,8 @@ def build_pdf(outfile, meta, top_latency, top_jitter, top_packet_loss, up_links,
     )
     doc.build(story)
 
+    tmp_file = outfile + ".part"
+    with open(tmp_file, "wb") as f:
+        f.write(buf.getbuffer())
+    os.replace(tmp_file, outfile)
+
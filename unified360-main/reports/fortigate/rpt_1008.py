@@ -48,5 +48,8 @@ class FortigateVpnReport:
             return build_excel(device=device, start=start_iso, end=end_iso, interval=interval)
         else:
             from .pdf_1008 import build_pdf
-            return build_pdf(device=device, start=start_iso, end=end_iso, interval=interval)
+            return build_pdf(
+                device=device, start=start_iso, end=end_iso, interval=interval,
+                start_dt=start_dt, end_dt=end_dt,
+            )
 
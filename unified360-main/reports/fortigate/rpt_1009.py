@@ -1,18 +1,37 @@
 # reports/fortigate/rpt_1009.py
 import os
+import heapq
 import time
 import json
 import tempfile
-from datetime import datetime
+from datetime import datetime, timezone
+from operator import itemgetter
 from flask import current_app
-from .pdf_1009 import build_pdf
-from .excel_1009 import build_excel
 
+try:
+    from ciso8601 import parse_datetime as _parse_iso  # optional C parser; handles "Z"
+except ImportError:
+    def _parse_iso(s):
+        return datetime.fromisoformat(s.replace("Z", "+00:00"))
+
+from services.http_utils import pooled_session, response_json
+
+# shared keep-alive pool for Influx queries
+_SESSION = pooled_session()
+
+# only the columns _normalize_row reads (hc_name comes back as the group-by tag)
 INFLUX_QUERY_TEMPLATE = """
-SELECT *
+SELECT "fgVWLHealthCheckLinkName", "fgVWLHealthCheckLinkIfName", "name",
+       "fgVWLHealthCheckLinkState", "fgVWLHealthCheckLinkLatency",
+       "fgVWLHealthCheckLinkJitter", "fgVWLHealthCheckLinkPacketLoss",
+       "fgVWLHealthCheckLinkMOS",
+       "bandwidth_in", "bandwidth_out",
+       "fgVWLHealthCheckLinkBandwidthIn", "fgVWLHealthCheckLinkBandwidthOut",
+       "fgVWLHealthCheckLinkUsedBandwidthIn", "fgVWLHealthCheckLinkUsedBandwidthOut",
+       "hostname", "host", "time_stamp"
 FROM sdwan_health
-WHERE time >= '{start}' AND time <= '{end}'
-AND hostname = '{device}' group by hc_name order by time desc limit 1
+WHERE time >= $start AND time <= $end
+AND hostname = $device group by hc_name order by time desc limit 1
 """
 
 
@@ -39,9 +58,13 @@ def normalize_ts(ts):
 def _safe_float(v, default=0.0):
     if v is None:
         return default
+    # Influx JSON already yields int/float for numeric fields — skip the string path
+    t = type(v)
+    if t is float:
+        return v
+    if t is int:
+        return float(v)
     try:
-        if isinstance(v, (int, float)):
-            return float(v)
         s = str(v).strip()
         if s.endswith('%'):
             s = s[:-1]
@@ -49,43 +72,76 @@ def _safe_float(v, default=0.0):
     except Exception:
         return default
 
+def _time_key(t):
+    """
+    Sortable epoch seconds for a row's time. Influx RFC3339 strings don't
+    compare chronologically as text (trailing fractional zeros are
+    dropped: "...00Z" > "...00.5Z"), so they are parsed; unparseable
+    values sort first.
+    """
+    if isinstance(t, (int, float)):
+        return float(t)
+    try:
+        dt = _parse_iso(str(t).strip())
+    except Exception:
+        return float("-inf")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _latest_per_link(rows):
+    """
+    Deduplicate normalized rows by link name, keeping the latest row by
+    parsed time (ties keep the later row). First-seen link order is kept.
+    """
+    by_name = {}
+    for r in rows:
+        key = r['link_name'] or r['ifname'] + '::' + r['hostname']
+        ts = _time_key(r['time'])
+        prev = by_name.get(key)
+        if prev is None or ts >= prev[0]:
+            by_name[key] = (ts, r)
+    return [r for _, r in by_name.values()]
+
+
 def _normalize_row(raw):
     # raw is dict-like row returned from influx (column -> value)
+    get = raw.get
     r = {}
     # copy link name
-    r['link_name'] = raw.get('fgVWLHealthCheckLinkName') or raw.get('hc_name') or raw.get('fgVWLHealthCheckLinkName') or raw.get('fgVWLHealthCheckLinkIfName') or raw.get('fgVWLHealthCheckLinkName') or raw.get('name') or ''
+    r['link_name'] = get('fgVWLHealthCheckLinkName') or get('hc_name') or get('fgVWLHealthCheckLinkIfName') or get('name') or ''
     # parse state: treat state == 1 as DOWN, else UP
-    try:
-        state = int(raw.get('fgVWLHealthCheckLinkState', 0))
-    except Exception:
-        # sometimes it's string "0" or "1", handle gracefully
+    state = get('fgVWLHealthCheckLinkState', 0)
+    if type(state) is not int:
+        # sometimes it's string "0" or "1" (or a float), handle gracefully
         try:
-            state = int(str(raw.get('fgVWLHealthCheckLinkState', '0')).strip())
+            state = int(state)
         except Exception:
             state = 0
     r['state_raw'] = state
     r['status'] = 'DOWN' if state == 1 else 'UP'
     # latency/jitter: may be strings
-    r['latency_ms'] = _safe_float(raw.get('fgVWLHealthCheckLinkLatency'), 0.0)
-    r['jitter_ms'] = _safe_float(raw.get('fgVWLHealthCheckLinkJitter'), 0.0)
+    r['latency_ms'] = _safe_float(get('fgVWLHealthCheckLinkLatency'), 0.0)
+    r['jitter_ms'] = _safe_float(get('fgVWLHealthCheckLinkJitter'), 0.0)
     # packet loss percent
-    r['packet_loss'] = _safe_float(raw.get('fgVWLHealthCheckLinkPacketLoss'), 0.0)
+    r['packet_loss'] = _safe_float(get('fgVWLHealthCheckLinkPacketLoss'), 0.0)
     # MOS
     try:
-        r['mos'] = float(raw.get('fgVWLHealthCheckLinkMOS') or 0.0)
+        r['mos'] = float(get('fgVWLHealthCheckLinkMOS') or 0.0)
     except Exception:
         r['mos'] = 0.0
     # bandwidth fields (in bytes or bits depending on ingestion) — preserve raw ints
-    r['bandwidth_in'] = int(raw.get('bandwidth_in') or raw.get('fgVWLHealthCheckLinkBandwidthIn') or 0)
-    r['bandwidth_out'] = int(raw.get('bandwidth_out') or raw.get('fgVWLHealthCheckLinkBandwidthOut') or 0)
-    r['used_bandwidth_in'] = int(raw.get('fgVWLHealthCheckLinkUsedBandwidthIn') or 0)
-    r['used_bandwidth_out'] = int(raw.get('fgVWLHealthCheckLinkUsedBandwidthOut') or 0)
+    r['bandwidth_in'] = int(get('bandwidth_in') or get('fgVWLHealthCheckLinkBandwidthIn') or 0)
+    r['bandwidth_out'] = int(get('bandwidth_out') or get('fgVWLHealthCheckLinkBandwidthOut') or 0)
+    r['used_bandwidth_in'] = int(get('fgVWLHealthCheckLinkUsedBandwidthIn') or 0)
+    r['used_bandwidth_out'] = int(get('fgVWLHealthCheckLinkUsedBandwidthOut') or 0)
     # interface / ifname
-    r['ifname'] = raw.get('fgVWLHealthCheckLinkIfName') or raw.get('fgVWLHealthCheckLinkName') or raw.get('fgVWLHealthCheckLinkIfName') or ''
+    r['ifname'] = get('fgVWLHealthCheckLinkIfName') or get('fgVWLHealthCheckLinkName') or ''
     # hostname / device
-    r['hostname'] = raw.get('hostname') or raw.get('host') or ''
+    r['hostname'] = get('hostname') or get('host') or ''
     # time (use the raw time if present)
-    r['time'] = raw.get('time') or raw.get('time_stamp') or ''
+    r['time'] = get('time') or get('time_stamp') or ''
     return r
 
 def _flatten_influx_results(resp_json):
@@ -154,45 +210,39 @@ def run(device: str, start: str, end: str, fmt: str = "pdf"):
     start = normalize_ts(start)
     end   = normalize_ts(end)
 
-    q = INFLUX_QUERY_TEMPLATE.format(start=start, end=end, device=device)
+    q = INFLUX_QUERY_TEMPLATE
 
-    print(q)
+    current_app.logger.debug("influx query: %s", q)
 
-    params = {"db": influx_db, "q": q}
-    import requests
-    resp = requests.get(influx_url, params=params, timeout=30)
+    # bound parameters: the query text stays constant and user input is
+    # never spliced into InfluxQL
+    params = {
+        "db": influx_db,
+        "q": q,
+        "params": json.dumps({"start": start, "end": end, "device": device}),
+    }
+    resp = _SESSION.get(influx_url, params=params, timeout=30)
     resp.raise_for_status()
-    data = resp.json()
+    data = response_json(resp)
 
     raw_rows = _flatten_influx_results(data)
     normalized = [_normalize_row(r) for r in raw_rows]
 
-    # deduplicate by link name — keep latest by time if time present
-    by_name = {}
-    for r in normalized:
-        key = r.get('link_name') or (r.get('ifname') or '') + '::' + (r.get('hostname') or '')
-        # keep latest; if time parseable, compare
-        prev = by_name.get(key)
-        if prev is None:
-            by_name[key] = r
-        else:
-            # choose non-zero latency preferred, or latest time if available
-            by_name[key] = r  # simple override; can be improved if time comparators exist
-
-    rows = list(by_name.values())
+    rows = _latest_per_link(normalized)
 
     # split into up / down
     up_links = [r for r in rows if r['status'] == 'UP']
     down_links = [r for r in rows if r['status'] == 'DOWN']
 
     # sort UP lists for top-N
-    top_latency = sorted([r for r in up_links if r['latency_ms'] > 0], key=lambda x: x['latency_ms'], reverse=True)[:10]
-    top_jitter = sorted([r for r in up_links if r['jitter_ms'] > 0], key=lambda x: x['jitter_ms'], reverse=True)[:10]
-    top_packet_loss = sorted([r for r in up_links], key=lambda x: x['packet_loss'], reverse=True)[:10]
+    top_latency = heapq.nlargest(10, (r for r in up_links if r['latency_ms'] > 0), key=itemgetter('latency_ms'))
+    top_jitter = heapq.nlargest(10, (r for r in up_links if r['jitter_ms'] > 0), key=itemgetter('jitter_ms'))
+    top_packet_loss = heapq.nlargest(10, up_links, key=itemgetter('packet_loss'))
 
     # basic metadata
+    now = datetime.utcnow()
     meta = {
-        "generated_at": datetime.utcnow().isoformat() + "Z",
+        "generated_at": now.isoformat() + "Z",
         "device": device,
         "start": start,
         "end": end,
@@ -202,13 +252,15 @@ def run(device: str, start: str, end: str, fmt: str = "pdf"):
     }
 
     # Prepare output file path
-    ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    ts = now.strftime("%Y%m%d_%H%M%S")
     outdir = current_app.config.get("REPORTS_OUTDIR", "/tmp")
     os.makedirs(outdir, exist_ok=True)
     if fmt == "pdf":
+        from .pdf_1009 import build_pdf
         outfile = os.path.join(outdir, f"rpt_1009_sdwan_{device}_{ts}.pdf")
         build_pdf(outfile, meta, top_latency, top_jitter, top_packet_loss, up_links, down_links, rows)
     else:
+        from .excel_1009 import build_excel
         outfile = os.path.join(outdir, f"rpt_1009_sdwan_{device}_{ts}.xlsx")
         build_excel(outfile, meta, top_latency, top_jitter, top_packet_loss, up_links, down_links, rows)
 
@@ -3,11 +3,48 @@ import tempfile
 from datetime import datetime
 
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
 from openpyxl.formatting.rule import CellIsRule
 
-from .pdf_1006 import IST, _query_ping_timeseries
+from .pdf_1006 import PING_COLUMNS, _iso_to_ist, _query_ping_timeseries_many
+
+
+# ---------------------------------------------------
+#  STYLES (immutable; shared by every cell/sheet)
+# ---------------------------------------------------
+_THIN = Side(border_style="thin", color="999999")
+BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+CENTER = Alignment(horizontal="center")
+BOLD = Font(bold=True)
+TITLE_FONT = Font(size=14, bold=True)
+FILL_HEADER = PatternFill("solid", fgColor="DCE6F7")
+FILL_ALTROW = PatternFill("solid", fgColor="F7FAFF")
+DATE_FMT = "yyyy-mm-dd hh:mm:ss"
+
+
+def _solid(color):
+    return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+
+# (threshold, fill) for the conditional-formatting rules
+LATENCY_BANDS = (
+    ("250", _solid("FFF7D5")),   # >250 ms – light orange
+    ("500", _solid("FFBF00")),   # >500 ms – amber
+    ("1000", _solid("FF4C4C")),  # >1000 ms – red
+)
+LOSS_BANDS = (
+    ("25", _solid("FFF8CC")),    # ≥25% – light yellow
+    ("50", _solid("FFD966")),    # ≥50% – amber
+    ("75", _solid("FF4C4C")),    # ≥75% – red
+)
+
+
+def _bold_cell(ws, value, font=BOLD):
+    c = WriteOnlyCell(ws, value=value)
+    c.font = font
+    return c
 
 
 def build_excel(urls, start, end, interval):
@@ -21,20 +58,11 @@ def build_excel(urls, start, end, interval):
     ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
     outfile = os.path.join(out_dir, f"rpt_1006_ping_{ts}.xlsx")
 
-    wb = openpyxl.Workbook()
-
-    thin = Side(border_style="thin", color="999999")
-    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    # write-only: rows are streamed to the file instead of kept as a cell model
+    wb = openpyxl.Workbook(write_only=True)
 
-    fill_header = PatternFill("solid", fgColor="DCE6F7")
-    fill_altrow = PatternFill("solid", fgColor="F7FAFF")
-
-    # Remove default sheet
-    if "Sheet" in wb.sheetnames:
-        wb.remove(wb["Sheet"])
-
-    start_ist = datetime.fromisoformat(start.replace("Z", "+00:00")).astimezone(IST)
-    end_ist = datetime.fromisoformat(end.replace("Z", "+00:00")).astimezone(IST)
+    start_ist = _iso_to_ist(start)
+    end_ist = _iso_to_ist(end)
 
     headers = [
         "Time (IST)",
@@ -47,68 +75,77 @@ def build_excel(urls, start, end, interval):
         "Loss (%)",
     ]
 
+    # one Influx round-trip for every target
+    cols_by_url = _query_ping_timeseries_many(urls, start, end, interval)
+
     for idx, url in enumerate(urls):
         sheet_name = url[:31] or f"target_{idx+1}"
         ws = wb.create_sheet(title=sheet_name)
 
-        # ----------------- SHEET HEADER -----------------
-        ws["A1"] = "Ping Performance Report"
-        ws["A1"].font = Font(size=14, bold=True)
+        # ----------------- COLUMN WIDTHS -----------------
+        # write-only sheets need these before the first row is appended
+        for col in range(1, len(headers) + 1):
+            ws.column_dimensions[get_column_letter(col)].width = 22
 
-        ws["A3"] = f"Target: {url}"
-        ws["A4"] = (
+        # ----------------- SHEET HEADER -----------------
+        ws.append([_bold_cell(ws, "Ping Performance Report", TITLE_FONT)])
+        ws.append([])
+        ws.append([_bold_cell(ws, f"Target: {url}")])
+        ws.append([_bold_cell(
+            ws,
             f"Time Range: "
             f"{start_ist.strftime('%Y-%m-%d %H:%M:%S IST')} → "
-            f"{end_ist.strftime('%Y-%m-%d %H:%M:%S IST')}"
-        )
-        ws["A5"] = f"Interval: {interval}"
-        ws["A6"] = "(All times shown in IST)"
-
-        for r in range(1, 7):
-            ws[f"A{r}"].font = Font(bold=True)
+            f"{end_ist.strftime('%Y-%m-%d %H:%M:%S IST')}",
+        )])
+        ws.append([_bold_cell(ws, f"Interval: {interval}")])
+        ws.append([_bold_cell(ws, "(All times shown in IST)")])
+        ws.append([])
 
         # ----------------- TABLE HEADERS -----------------
         header_row = 8
-        for col, h in enumerate(headers, start=1):
-            c = ws.cell(row=header_row, column=col, value=h)
-            c.font = Font(bold=True)
-            c.fill = fill_header
-            c.alignment = Alignment(horizontal="center")
-            c.border = border
+        header_cells = []
+        for h in headers:
+            c = WriteOnlyCell(ws, value=h)
+            c.font = BOLD
+            c.fill = FILL_HEADER
+            c.alignment = CENTER
+            c.border = BORDER
+            header_cells.append(c)
+        ws.append(header_cells)
 
         # ----------------- DATA ROWS -----------------
-        rows = _query_ping_timeseries(url, start, end, interval)
+        cols = cols_by_url[url]
 
         rptr = header_row + 1
         odd = False
 
-        for row in rows:
-            dt_naive = row["time"].replace(tzinfo=None)
+        for t, avg, mn, mx, std, tx, rx, loss in zip(*(cols[k] for k in PING_COLUMNS)):
+            dt_naive = t.replace(tzinfo=None)
 
             values = [
                 dt_naive,
-                round(row["avg_ms"], 2),
-                round(row["min_ms"], 2),
-                round(row["max_ms"], 2),
-                round(row["stddev_ms"], 2),
-                row["tx"],
-                row["rx"],
-                round(row["loss_pct"], 2),
+                round(avg, 2),
+                round(mn, 2),
+                round(mx, 2),
+                round(std, 2),
+                tx,
+                rx,
+                round(loss, 2),
             ]
 
-            for col, val in enumerate(values, start=1):
-                c = ws.cell(row=rptr, column=col, value=val)
-                c.border = border
-
-                if isinstance(val, datetime):
-                    c.number_format = "yyyy-mm-dd hh:mm:ss"
-                    c.alignment = Alignment(horizontal="center")
-                else:
-                    c.alignment = Alignment(horizontal="center")
-
+            cells = []
+            for val in values:
+                c = WriteOnlyCell(ws, value=val)
+                c.border = BORDER
+                c.alignment = CENTER
                 if odd:
-                    c.fill = fill_altrow
+                    c.fill = FILL_ALTROW
+                cells.append(c)
 
+            # first column is the timestamp
+            cells[0].number_format = DATE_FMT
+
+            ws.append(cells)
             odd = not odd
             rptr += 1
 
@@ -119,105 +156,25 @@ def build_excel(urls, start, end, interval):
             # Latency columns: Avg (2), Min (3), Max (4), StdDev (5)
             latency_cols = [2, 3, 4, 5]
 
-            light_orange = "FFF7D5"  # >250 ms
-            amber = "FFBF00"        # >500 ms
-            red = "FF4C4C"          # >1000 ms
-
             for col in latency_cols:
                 col_letter = get_column_letter(col)
                 data_range = f"{col_letter}{header_row+1}:{col_letter}{data_end_row}"
 
-                # >250 ms – light orange
-                ws.conditional_formatting.add(
-                    data_range,
-                    CellIsRule(
-                        operator="greaterThan",
-                        formula=["250"],
-                        fill=PatternFill(
-                            start_color=light_orange,
-                            end_color=light_orange,
-                            fill_type="solid",
-                        ),
-                    ),
-                )
-
-                # >500 ms – amber
-                ws.conditional_formatting.add(
-                    data_range,
-                    CellIsRule(
-                        operator="greaterThan",
-                        formula=["500"],
-                        fill=PatternFill(
-                            start_color=amber,
-                            end_color=amber,
-                            fill_type="solid",
-                        ),
-                    ),
-                )
-
-                # >1000 ms – red
-                ws.conditional_formatting.add(
-                    data_range,
-                    CellIsRule(
-                        operator="greaterThan",
-                        formula=["1000"],
-                        fill=PatternFill(
-                            start_color=red,
-                            end_color=red,
-                            fill_type="solid",
-                        ),
-                    ),
-                )
+                for threshold, fill in LATENCY_BANDS:
+                    ws.conditional_formatting.add(
+                        data_range,
+                        CellIsRule(operator="greaterThan", formula=[threshold], fill=fill),
+                    )
 
             # Packet loss column: Loss (%) = 8
             loss_col_letter = get_column_letter(8)
             loss_range = f"{loss_col_letter}{header_row+1}:{loss_col_letter}{data_end_row}"
 
-            # ≥25% – light yellow
-            ws.conditional_formatting.add(
-                loss_range,
-                CellIsRule(
-                    operator="greaterThanOrEqual",
-                    formula=["25"],
-                    fill=PatternFill(
-                        start_color="FFF8CC",
-                        end_color="FFF8CC",
-                        fill_type="solid",
-                    ),
-                ),
-            )
-
-            # ≥50% – amber
-            ws.conditional_formatting.add(
-                loss_range,
-                CellIsRule(
-                    operator="greaterThanOrEqual",
-                    formula=["50"],
-                    fill=PatternFill(
-                        start_color="FFD966",
-                        end_color="FFD966",
-                        fill_type="solid",
-                    ),
-                ),
-            )
-
-            # ≥75% – red
-            ws.conditional_formatting.add(
-                loss_range,
-                CellIsRule(
-                    operator="greaterThanOrEqual",
-                    formula=["75"],
-                    fill=PatternFill(
-                        start_color="FF4C4C",
-                        end_color="FF4C4C",
-                        fill_type="solid",
-                    ),
-                ),
-            )
-
-        # ----------------- AUTO COLUMN WIDTHS -----------------
-        for col in range(1, len(headers) + 1):
-            ws.column_dimensions[get_column_letter(col)].width = 22
+            for threshold, fill in LOSS_BANDS:
+                ws.conditional_formatting.add(
+                    loss_range,
+                    CellIsRule(operator="greaterThanOrEqual", formula=[threshold], fill=fill),
+                )
 
     wb.save(outfile)
     return outfile
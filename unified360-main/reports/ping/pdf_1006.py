@@ -1,9 +1,16 @@
+import json
 import os
 import tempfile
+import threading
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache, partial
+from itertools import groupby
 
-import matplotlib.pyplot as plt
-import requests
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
 from flask import current_app
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import landscape, A4
@@ -19,12 +26,26 @@ from reportlab.platypus import (
     PageBreak,
 )
 
+from services import ops_cache
+from services.http_utils import influx_json, pooled_session
+
 # ---------------------------------------------------
 #  TIMEZONES
 # ---------------------------------------------------
 IST = timezone(timedelta(hours=5, minutes=30))
 UTC = timezone.utc
 
+
+@lru_cache(maxsize=64)
+def _iso_to_ist(ts):
+    # report window bounds: parsed once per distinct string (header repeats per target)
+    return datetime.fromisoformat(ts.replace("Z", "+00:00")).astimezone(IST)
+
+
+# shared keep-alive pool for Influx queries
+_SESSION = pooled_session()
+_TIMEOUT = (3, 30)  # connect, read
+
 _INTERVAL_SECONDS = {
     "1m": 60,
     "5m": 300,
@@ -36,25 +57,59 @@ _INTERVAL_SECONDS = {
 # ---------------------------------------------------
 #  DATA FETCH: PING TIMESERIES
 # ---------------------------------------------------
-def _query_ping_timeseries(url, start_iso, end_iso, interval):
+PING_COLUMNS = ("time", "avg_ms", "min_ms", "max_ms", "stddev_ms", "tx", "rx", "loss_pct")
+
+
+def _empty_ping_columns():
+    return {k: [] for k in PING_COLUMNS}
+
+
+# cached timeseries are shared between callers: treat them as read-only
+_TS_CACHE_TTL = 120
+
+
+def _ts_cache_key(url, start_iso, end_iso, interval):
+    return f"rpt1006:ts:{url}:{start_iso}:{end_iso}:{interval}"
+
+
+def _float_col(vals):
+    return [float(x or 0.0) for x in vals]
+
+
+def _int_col(vals):
+    return [int(x or 0) for x in vals]
+
+
+def _query_ping_timeseries_many(urls, start_iso, end_iso, interval):
     """
-    Query InfluxDB for ping stats for a given URL/IP.
+    Query InfluxDB for ping stats of several URLs/IPs in one round-trip.
 
-    Returns list of dicts:
-      {
-        "time": IST datetime,
-        "avg_ms": float,
-        "min_ms": float,
-        "max_ms": float,
-        "stddev_ms": float,
-        "tx": int,
-        "rx": int,
-        "loss_pct": float,
-      }
+    Returns {url: columns}, columns as described in _query_ping_timeseries.
+    URLs with no data map to empty columns. Raises when the query fails.
     """
     influx_url = current_app.config["INFLUXDB_URL"]
     influx_db = current_app.config["INFLUXDB_DB"]
 
+    # serve what we can from the short-lived cache (a PDF and an Excel run
+    # over the same window back-to-back hit Influx only once)
+    out = {}
+    missing = []
+    for url in urls:
+        hit = ops_cache.series.get(_ts_cache_key(url, start_iso, end_iso, interval))
+        if hit is not None:
+            out[url] = hit
+        else:
+            out[url] = _empty_ping_columns()
+            missing.append(url)
+    if not missing:
+        return out
+
+    # bound parameters ($url0, $url1, ...) instead of quoting URLs into InfluxQL
+    bind = {"start": start_iso, "end": end_iso}
+    for i, url in enumerate(missing):
+        bind[f"url{i}"] = url
+    url_filter = " OR ".join(f'"url" = $url{i}' for i in range(len(missing)))
+
     q = f"""
     SELECT
         mean("average_response_ms") AS avg_rtt,
@@ -65,47 +120,75 @@ def _query_ping_timeseries(url, start_iso, end_iso, interval):
         sum("packets_received") AS rx,
         mean("percent_packet_loss") AS loss_pct
     FROM "ping"
-    WHERE "url" = '{url}'
-      AND time >= '{start_iso}' AND time <= '{end_iso}'
-    GROUP BY time({interval}) fill(null)
+    WHERE ({url_filter})
+      AND time >= $start AND time <= $end
+    GROUP BY "url", time({interval}) fill(null)
     """
 
-    resp = requests.get(influx_url, params={"db": influx_db, "q": q})
-    data = resp.json()
+    resp = _SESSION.get(
+        influx_url,
+        # epoch=s: times come back as ints, no per-row ISO string parsing
+        params={"db": influx_db, "q": q, "params": json.dumps(bind), "epoch": "s"},
+        timeout=_TIMEOUT,
+    )
+    # raises on HTTP/Influx errors, so nothing below caches a failed query
+    data = influx_json(resp)
 
-    rows = []
+    # one series per "url" tag
     series = data.get("results", [{}])[0].get("series", [])
-    if not series:
-        return rows
-
-    values = series[0].get("values", [])
-
-    for v in values:
-        # v: [time, avg_rtt, min_rtt, max_rtt, stddev_rtt, tx, rx, loss_pct]
-        t_utc = datetime.fromisoformat(v[0].replace("Z", "+00:00"))
-        t_ist = t_utc.astimezone(IST)
-
-        rows.append(
-            {
-                "time": t_ist,
-                "avg_ms": float(v[1] or 0.0),
-                "min_ms": float(v[2] or 0.0),
-                "max_ms": float(v[3] or 0.0),
-                "stddev_ms": float(v[4] or 0.0),
-                "tx": int(v[5] or 0),
-                "rx": int(v[6] or 0),
-                "loss_pct": float(v[7] or 0.0),
-            }
+    for s in series:
+        url = s.get("tags", {}).get("url")
+        values = s.get("values", [])
+        if url not in missing or not values:
+            continue
+
+        # transpose once: v = [time, avg_rtt, min_rtt, max_rtt, stddev_rtt, tx, rx, loss_pct]
+        t_raw, avg, mn, mx, std, tx, rx, loss = zip(*values)
+
+        out[url] = {
+            "time": [datetime.fromtimestamp(t, IST) for t in t_raw],
+            "avg_ms": _float_col(avg),
+            "min_ms": _float_col(mn),
+            "max_ms": _float_col(mx),
+            "stddev_ms": _float_col(std),
+            "tx": _int_col(tx),
+            "rx": _int_col(rx),
+            "loss_pct": _float_col(loss),
+        }
+
+    for url in missing:
+        ops_cache.series.set_value(
+            _ts_cache_key(url, start_iso, end_iso, interval), out[url], ttl_seconds=_TS_CACHE_TTL
         )
 
-    return rows
+    return out
+
+
+def _query_ping_timeseries(url, start_iso, end_iso, interval):
+    """
+    Query InfluxDB for ping stats for a given URL/IP.
+
+    Returns columns (one list per field, all the same length):
+      {
+        "time": [IST datetime, ...],
+        "avg_ms": [float, ...],
+        "min_ms": [float, ...],
+        "max_ms": [float, ...],
+        "stddev_ms": [float, ...],
+        "tx": [int, ...],
+        "rx": [int, ...],
+        "loss_pct": [float, ...],
+      }
+    """
+    return _query_ping_timeseries_many([url], start_iso, end_iso, interval)[url]
 
 
 # ---------------------------------------------------
 #  SUMMARY METRICS
 # ---------------------------------------------------
-def _summary(rows):
-    if not rows:
+def _summary(cols):
+    n = len(cols["time"])
+    if not n:
         return {
             "avg": 0.0,
             "min": 0.0,
@@ -115,25 +198,31 @@ def _summary(rows):
             "availability": 0.0,
         }
 
-    avg_vals = [r["avg_ms"] for r in rows]
-    min_vals = [r["min_ms"] for r in rows]
-    max_vals = [r["max_ms"] for r in rows]
-    std_vals = [r["stddev_ms"] for r in rows]
-    loss_vals = [r["loss_pct"] for r in rows]
-
-    loss_avg = sum(loss_vals) / len(loss_vals)
+    loss_avg = sum(cols["loss_pct"]) / n
     availability = max(0.0, 100.0 - loss_avg)
 
     return {
-        "avg": sum(avg_vals) / len(avg_vals),
-        "min": min(min_vals),
-        "max": max(max_vals),
-        "stddev": sum(std_vals) / len(std_vals),
+        "avg": sum(cols["avg_ms"]) / n,
+        "min": min(cols["min_ms"]),
+        "max": max(cols["max_ms"]),
+        "stddev": sum(cols["stddev_ms"]) / n,
         "loss": loss_avg,
         "availability": availability,
     }
 
 
+# ---------------------------------------------------
+#  THRESHOLD BANDS (0 = no highlight)
+# ---------------------------------------------------
+# band = number of thresholds crossed; partial(bisect_*) keeps the whole
+# map(band_of, column) in C
+_LATENCY_THRESH = (250, 500, 1000)  # >250 / >500 / >1000 ms
+_LOSS_THRESH = (25, 50, 75)         # ≥25 / ≥50 / ≥75 %
+
+_latency_band = partial(bisect_left, _LATENCY_THRESH)
+_loss_band = partial(bisect_right, _LOSS_THRESH)
+
+
 # ---------------------------------------------------
 #  HEADER (Enterprise – Autointelli theme)
 # ---------------------------------------------------
@@ -141,8 +230,8 @@ def _add_header(story, urls, start_iso, end_iso, interval):
     styles = getSampleStyleSheet()
     blue = colors.HexColor("#0052CC")
 
-    start_ist = datetime.fromisoformat(start_iso.replace("Z", "+00:00")).astimezone(IST)
-    end_ist = datetime.fromisoformat(end_iso.replace("Z", "+00:00")).astimezone(IST)
+    start_ist = _iso_to_ist(start_iso)
+    end_ist = _iso_to_ist(end_iso)
 
     # Preferred logo path
     logo_path = None
@@ -215,15 +304,20 @@ def _add_header(story, urls, start_iso, end_iso, interval):
 # ---------------------------------------------------
 #  LATENCY CHART
 # ---------------------------------------------------
-def _build_latency_chart(rows, url, interval):
-    if not rows:
+def _build_latency_chart(fig, cols, url, interval):
+    """
+    Render one target's latency chart on `fig` (cleared first) and return
+    the PNG path. Each render thread reuses its own Figure across targets.
+    """
+    if not cols["time"]:
         return None
 
-    times = [r["time"] for r in rows]  # IST datetimes
-    avg = [r["avg_ms"] for r in rows]
-    mx = [r["max_ms"] for r in rows]
+    times = cols["time"]  # IST datetimes
+    avg = cols["avg_ms"]
+    mx = cols["max_ms"]
 
-    fig, ax = plt.subplots(figsize=(9, 2.6))
+    fig.clear()
+    ax = fig.add_subplot()
     ax.plot(times, avg, label="Avg RTT (ms)", linewidth=1.1)
     ax.plot(times, mx, label="Max RTT (ms)", linewidth=1.1)
 
@@ -235,13 +329,42 @@ def _build_latency_chart(rows, url, interval):
 
     tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
     fig.savefig(tmp.name, dpi=120, bbox_inches="tight")
-    plt.close(fig)
     return tmp.name
 
 
+# matches the Influx session pool size
+_CHART_WORKERS = 8
+_chart_local = threading.local()
+
+
+def _thread_figure():
+    fig = getattr(_chart_local, "fig", None)
+    if fig is None:
+        fig = _chart_local.fig = Figure(figsize=(9, 2.6))
+    return fig
+
+
+def _render_charts(urls, cols_by_url, interval):
+    """
+    Render the latency chart of every target, in parallel when there are
+    several. Returns {url: png_path or None}.
+    """
+    def render(url):
+        return _build_latency_chart(_thread_figure(), cols_by_url[url], url, interval)
+
+    if len(urls) < 2:
+        return {url: render(url) for url in urls}
+
+    with ThreadPoolExecutor(max_workers=min(len(urls), _CHART_WORKERS)) as pool:
+        return dict(zip(urls, pool.map(render, urls)))
+
+
 # ---------------------------------------------------
 #  BUILD PDF
 # ---------------------------------------------------
+_fmt2 = "{:.2f}".format  # bound once; mapped over whole columns
+
+
 def build_pdf(urls, start, end, interval):
     """
     Build final Ping Performance PDF with Autointelli branding + color-coded table.
@@ -273,9 +396,14 @@ def build_pdf(urls, start, end, interval):
     # Main header for all targets
     _add_header(story, urls, start, end, interval)
 
+    # one Influx round-trip for every target
+    cols_by_url = _query_ping_timeseries_many(urls, start, end, interval)
+
+    chart_paths = _render_charts(urls, cols_by_url, interval)
+
     first = True
     for url in urls:
-        rows = _query_ping_timeseries(url, start, end, interval)
+        cols = cols_by_url[url]
 
         if not first:
             story.append(PageBreak())
@@ -286,7 +414,7 @@ def build_pdf(urls, start, end, interval):
         story.append(Spacer(1, 3 * mm))
 
         # Summary block
-        s = _summary(rows)
+        s = _summary(cols)
         summary_data = [
             [
                 "Avg RTT", f"{s['avg']:.2f} ms",
@@ -318,7 +446,7 @@ def build_pdf(urls, start, end, interval):
         story.append(Spacer(1, 5 * mm))
 
         # Latency chart
-        chart_path = _build_latency_chart(rows, url, interval)
+        chart_path = chart_paths[url]
         if chart_path:
             story.append(Image(chart_path, width=250 * mm, height=60 * mm))
             story.append(Spacer(1, 5 * mm))
@@ -339,19 +467,19 @@ def build_pdf(urls, start, end, interval):
             ]
         ]
 
-        for r in rows:
-            table_data.append(
-                [
-                    r["time"].strftime("%Y-%m-%d %H:%M:%S"),
-                    f"{r['avg_ms']:.2f}",
-                    f"{r['min_ms']:.2f}",
-                    f"{r['max_ms']:.2f}",
-                    f"{r['stddev_ms']:.2f}",
-                    r["tx"],
-                    r["rx"],
-                    f"{r['loss_pct']:.2f}",
-                ]
+        # format column-by-column (one map per column) and zip into rows
+        table_data.extend(
+            zip(
+                [t.strftime("%Y-%m-%d %H:%M:%S") for t in cols["time"]],
+                map(_fmt2, cols["avg_ms"]),
+                map(_fmt2, cols["min_ms"]),
+                map(_fmt2, cols["max_ms"]),
+                map(_fmt2, cols["stddev_ms"]),
+                cols["tx"],
+                cols["rx"],
+                map(_fmt2, cols["loss_pct"]),
             )
+        )
 
         tbl = Table(table_data, repeatRows=1)
 
@@ -382,46 +510,28 @@ def build_pdf(urls, start, end, interval):
         loss_amber = colors.HexColor("#FFD966")    # ≥50%
         loss_red = colors.HexColor("#FF4C4C")      # ≥75%
 
+        latency_colors = (None, light_orange, amber, red)
+        loss_colors = (None, loss_yellow, loss_amber, loss_red)
+
+        # Classify each column once, then emit commands only for flagged runs.
         # Data rows in the table start at row index 1 (0 is header)
         # cols: 0=Time, 1=Avg, 2=Min, 3=Max, 4=Std, 5=Tx, 6=Rx, 7=Loss
-        for row_idx, r in enumerate(rows, start=1):
-            # Latency values
-            latency_vals = [
-                (1, r["avg_ms"]),
-                (2, r["min_ms"]),
-                (3, r["max_ms"]),
-                (4, r["stddev_ms"]),
-            ]
-
-            for col_idx, val in latency_vals:
-                if val > 1000:
-                    dynamic_style.append(
-                        ("BACKGROUND", (col_idx, row_idx), (col_idx, row_idx), red)
-                    )
-                elif val > 500:
-                    dynamic_style.append(
-                        ("BACKGROUND", (col_idx, row_idx), (col_idx, row_idx), amber)
-                    )
-                elif val > 250:
+        for col_idx, key, band_of, palette in (
+            (1, "avg_ms", _latency_band, latency_colors),
+            (2, "min_ms", _latency_band, latency_colors),
+            (3, "max_ms", _latency_band, latency_colors),
+            (4, "stddev_ms", _latency_band, latency_colors),
+            (7, "loss_pct", _loss_band, loss_colors),
+        ):
+            # run-length encode: one command per run of equal bands
+            row_idx = 1
+            for band, run in groupby(map(band_of, cols[key])):
+                n = sum(1 for _ in run)
+                if band:
                     dynamic_style.append(
-                        ("BACKGROUND", (col_idx, row_idx), (col_idx, row_idx), light_orange)
+                        ("BACKGROUND", (col_idx, row_idx), (col_idx, row_idx + n - 1), palette[band])
                     )
-
-            # Packet loss column (col 7)
-            loss = r["loss_pct"]
-            col_loss = 7
-            if loss >= 75:
-                dynamic_style.append(
-                    ("BACKGROUND", (col_loss, row_idx), (col_loss, row_idx), loss_red)
-                )
-            elif loss >= 50:
-                dynamic_style.append(
-                    ("BACKGROUND", (col_loss, row_idx), (col_loss, row_idx), loss_amber)
-                )
-            elif loss >= 25:
-                dynamic_style.append(
-                    ("BACKGROUND", (col_loss, row_idx), (col_loss, row_idx), loss_yellow)
-                )
+                row_idx += n
 
         tbl.setStyle(TableStyle(base_style + dynamic_style))
         story.append(tbl)
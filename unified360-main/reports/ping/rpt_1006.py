@@ -1,5 +1,10 @@
 from datetime import datetime, timezone, timedelta
 
+try:
+    from ciso8601 import parse_datetime as _parse_iso  # optional C parser
+except ImportError:
+    _parse_iso = datetime.fromisoformat
+
 
 IST = timezone(timedelta(hours=5, minutes=30))
 
@@ -11,8 +16,8 @@ def _parse_html_ts(ts_str: str) -> datetime:
     if not ts_str:
         raise ValueError("Missing timestamp")
 
-    fmt = "%Y-%m-%dT%H:%M" if len(ts_str) == 16 else "%Y-%m-%dT%H:%M:%S"
-    local_dt = datetime.strptime(ts_str, fmt)
+    # accepts both "YYYY-MM-DDTHH:MM" and "YYYY-MM-DDTHH:MM:SS"
+    local_dt = _parse_iso(ts_str)
     ist_dt = local_dt.replace(tzinfo=IST)
     return ist_dt.astimezone(timezone.utc)
 
@@ -48,8 +53,7 @@ class PingPerformanceReport:
             raise ValueError("At least one IP / URL must be selected")
 
         # dedupe / clean
-        url_list = [u for u in urls if u]
-        url_list = list(dict.fromkeys(url_list))
+        url_list = list(dict.fromkeys(u for u in urls if u))
 
         start_dt = _parse_html_ts(start)
         end_dt = _parse_html_ts(end)
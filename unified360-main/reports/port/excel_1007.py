@@ -3,11 +3,79 @@ import tempfile
 from datetime import datetime
 
 import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
-from openpyxl.formatting.rule import CellIsRule, FormulaRule
 
-from .pdf_1007 import IST, _query_port_timeseries
+from .port_data import IST, _query_port_timeseries_many
+
+
+# ---------------------------------------------------
+#  STYLES (immutable; shared by every cell/sheet)
+# ---------------------------------------------------
+_THIN = Side(border_style="thin", color="999999")
+BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+CENTER = Alignment(horizontal="center")
+BOLD = Font(bold=True)
+TITLE_FONT = Font(size=14, bold=True)
+FILL_HEADER = PatternFill("solid", fgColor="DCE6F7")
+FILL_ALTROW = PatternFill("solid", fgColor="F7FAFF")
+DATE_FMT = "yyyy-mm-dd hh:mm:ss"
+
+
+def _solid(color):
+    return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+
+# threshold fills
+RED = _solid("FFCCCC")
+AMBER = _solid("FFDD99")
+LORANGE = _solid("FFF2CC")
+GREEN = _solid("CCFFCC")
+
+
+def _latency_fill(ms):
+    # >1000 red / >500 amber / >250 light orange
+    if ms > 1000:
+        return RED
+    if ms > 500:
+        return AMBER
+    if ms > 250:
+        return LORANGE
+    return None
+
+
+def _availability_fill(pct):
+    # <50 red / 50–75 amber / >=75 green
+    if pct < 50:
+        return RED
+    if pct < 75:
+        return AMBER
+    return GREEN
+
+
+def _add_row_styles(wb):
+    """
+    Register the data-row named styles on `wb`; cells then carry one style
+    reference instead of separate border/alignment/fill/format assignments.
+    NamedStyle objects bind to a workbook, so they are created per build.
+    """
+    for name, fill, number_format in (
+        ("even_data", None, "General"),
+        ("odd_data", FILL_ALTROW, "General"),
+        ("even_date", None, DATE_FMT),
+        ("odd_date", FILL_ALTROW, DATE_FMT),
+    ):
+        style = NamedStyle(name=name, border=BORDER, alignment=CENTER, number_format=number_format)
+        if fill is not None:
+            style.fill = fill
+        wb.add_named_style(style)
+
+
+def _bold_cell(ws, value, font=BOLD):
+    c = WriteOnlyCell(ws, value=value)
+    c.font = font
+    return c
 
 
 def build_excel(targets, start, end, interval):
@@ -22,18 +90,9 @@ def build_excel(targets, start, end, interval):
     ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
     outfile = os.path.join(out_dir, f"rpt_1007_port_{ts}.xlsx")
 
-    wb = openpyxl.Workbook()
-
-    # Basic styles
-    thin = Side(border_style="thin", color="999999")
-    border = Border(left=thin, right=thin, top=thin, bottom=thin)
-
-    fill_header = PatternFill("solid", fgColor="DCE6F7")
-    fill_altrow = PatternFill("solid", fgColor="F7FAFF")
-
-    # Remove default sheet
-    if "Sheet" in wb.sheetnames:
-        wb.remove(wb["Sheet"])
+    # write-only: rows are streamed to the file instead of kept as a cell model
+    wb = openpyxl.Workbook(write_only=True)
+    _add_row_styles(wb)
 
     # Convert report range to IST for display
     start_ist = datetime.fromisoformat(start.replace("Z", "+00:00")).astimezone(IST)
@@ -48,6 +107,8 @@ def build_excel(targets, start, end, interval):
         "Availability (%)",
     ]
 
+    rows_by_target = _query_port_timeseries_many(targets, start, end, interval)
+
     for idx, t in enumerate(targets):
         server = t["server"]
         port = t["port"]
@@ -58,35 +119,39 @@ def build_excel(targets, start, end, interval):
         sheet_name = f"{server}_{port}"[:31] or f"target_{idx+1}"
         ws = wb.create_sheet(title=sheet_name)
 
-        # ----------------- SHEET HEADER -----------------
-        ws["A1"] = "Port Performance Report"
-        ws["A1"].font = Font(size=14, bold=True)
+        # ----------------- COLUMN WIDTHS -----------------
+        # write-only sheets need these before the first row is appended
+        for col in range(1, len(headers) + 1):
+            ws.column_dimensions[get_column_letter(col)].width = 22
 
-        ws["A3"] = f"Target: {server}:{port}"
-        ws["A4"] = (
+        # ----------------- SHEET HEADER -----------------
+        ws.append([_bold_cell(ws, "Port Performance Report", TITLE_FONT)])
+        ws.append([])
+        ws.append([_bold_cell(ws, f"Target: {server}:{port}")])
+        ws.append([_bold_cell(
+            ws,
             f"Time Range: "
             f"{start_ist.strftime('%Y-%m-%d %H:%M:%S IST')} → "
-            f"{end_ist.strftime('%Y-%m-%d %H:%M:%S IST')}"
-        )
-        ws["A5"] = f"Interval: {interval}"
-        ws["A6"] = "(All times shown in IST)"
-
-        for r in range(1, 7):
-            ws[f"A{r}"].font = Font(bold=True)
+            f"{end_ist.strftime('%Y-%m-%d %H:%M:%S IST')}",
+        )])
+        ws.append([_bold_cell(ws, f"Interval: {interval}")])
+        ws.append([_bold_cell(ws, "(All times shown in IST)")])
+        ws.append([])
 
         # ----------------- TABLE HEADERS -----------------
-        header_row = 8
-        for col, h in enumerate(headers, start=1):
-            c = ws.cell(row=header_row, column=col, value=h)
-            c.font = Font(bold=True)
-            c.fill = fill_header
-            c.alignment = Alignment(horizontal="center")
-            c.border = border
+        header_cells = []
+        for h in headers:
+            c = WriteOnlyCell(ws, value=h)
+            c.font = BOLD
+            c.fill = FILL_HEADER
+            c.alignment = CENTER
+            c.border = BORDER
+            header_cells.append(c)
+        ws.append(header_cells)
 
         # ----------------- DATA ROWS -----------------
-        rows = _query_port_timeseries(server, port, start, end, interval)
+        rows = rows_by_target[(server, port)]
 
-        rptr = header_row + 1
         odd = False
 
         for row in rows:
@@ -102,131 +167,29 @@ def build_excel(targets, start, end, interval):
                 round(row["availability"], 2),
             ]
 
-            for col, val in enumerate(values, start=1):
-                c = ws.cell(row=rptr, column=col, value=val)
-                c.border = border
-
-                if isinstance(val, datetime):
-                    c.number_format = "yyyy-mm-dd hh:mm:ss"
-                    c.alignment = Alignment(horizontal="center")
-                else:
-                    c.alignment = Alignment(horizontal="center")
-
-                if odd:
-                    c.fill = fill_altrow
-
+            data_style, date_style = ("odd_data", "odd_date") if odd else ("even_data", "even_date")
+
+            # first column is the timestamp
+            cells = []
+            style = date_style
+            for val in values:
+                c = WriteOnlyCell(ws, value=val)
+                c.style = style
+                cells.append(c)
+                style = data_style
+
+            # colour bands – known at write time, so fill directly instead
+            # of registering conditional-formatting rules per sheet
+            mean_fill = _latency_fill(values[1])
+            if mean_fill is not None:
+                cells[1].fill = mean_fill
+            max_fill = _latency_fill(values[2])
+            if max_fill is not None:
+                cells[2].fill = max_fill
+            cells[5].fill = _availability_fill(values[5])
+
+            ws.append(cells)
             odd = not odd
-            rptr += 1
-
-        data_end_row = rptr - 1
-
-        # ----------------- CONDITIONAL FORMATTING -----------------
-        if data_end_row >= header_row + 1:
-            # Colors
-            RED = PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")
-            AMBER = PatternFill(start_color="FFDD99", end_color="FFDD99", fill_type="solid")
-            LORANGE = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
-            GREEN = PatternFill(start_color="CCFFCC", end_color="CCFFCC", fill_type="solid")
-
-            # Column letters
-            mean_col_letter = get_column_letter(2)  # "Mean Resp (ms)"
-            max_col_letter = get_column_letter(3)   # "Max Resp (ms)"
-            avail_col_letter = get_column_letter(6) # "Availability (%)"
-
-            mean_range = f"{mean_col_letter}{header_row+1}:{mean_col_letter}{data_end_row}"
-            max_range = f"{max_col_letter}{header_row+1}:{max_col_letter}{data_end_row}"
-            avail_range = f"{avail_col_letter}{header_row+1}:{avail_col_letter}{data_end_row}"
-
-            # ------------------------------------
-            # RESPONSE TIME (Mean + Max)
-            # Rules:
-            #   > 1000 → Red
-            #   > 500  → Amber
-            #   > 250  → Light Orange
-            # (Note: rules are overlapping; Excel applies them in order, last rule wins.
-            #  We want the strongest to dominate, so we add from lowest to highest.)
-            # ------------------------------------
-
-            # Light Orange >250
-            ws.conditional_formatting.add(
-                mean_range,
-                CellIsRule(operator="greaterThan", formula=["250"], fill=LORANGE),
-            )
-            ws.conditional_formatting.add(
-                max_range,
-                CellIsRule(operator="greaterThan", formula=["250"], fill=LORANGE),
-            )
-
-            # Amber >500 (overrides light orange)
-            ws.conditional_formatting.add(
-                mean_range,
-                CellIsRule(operator="greaterThan", formula=["500"], fill=AMBER),
-            )
-            ws.conditional_formatting.add(
-                max_range,
-                CellIsRule(operator="greaterThan", formula=["500"], fill=AMBER),
-            )
-
-            # Red >1000 (overrides amber)
-            ws.conditional_formatting.add(
-                mean_range,
-                CellIsRule(operator="greaterThan", formula=["1000"], fill=RED),
-            )
-            ws.conditional_formatting.add(
-                max_range,
-                CellIsRule(operator="greaterThan", formula=["1000"], fill=RED),
-            )
-
-            # ------------------------------------
-            # AVAILABILITY
-            # Rules:
-            #   < 50  → Red
-            #   50–75 → Amber
-            #   >=75  → Green
-            # We'll use formula-based rules so they don't overlap incorrectly.
-            # ------------------------------------
-            first_data_row = header_row + 1
-
-            # RED: < 50
-            ws.conditional_formatting.add(
-                avail_range,
-                CellIsRule(
-                    operator="lessThan",
-                    formula=["50"],
-                    fill=RED,
-                ),
-            )
-
-            # AMBER: >=50 AND <75
-            amber_formula = (
-                f'AND({avail_col_letter}{first_data_row}>="50",'
-                f'{avail_col_letter}{first_data_row}<"75")'
-            )
-            # However, CellIsRule doesn't support AND; use FormulaRule instead:
-            ws.conditional_formatting.add(
-                avail_range,
-                FormulaRule(
-                    formula=[
-                        f'AND({avail_col_letter}{first_data_row}>=50,'
-                        f'{avail_col_letter}{first_data_row}<75)'
-                    ],
-                    fill=AMBER,
-                ),
-            )
-
-            # GREEN: >= 75
-            ws.conditional_formatting.add(
-                avail_range,
-                CellIsRule(
-                    operator="greaterThanOrEqual",
-                    formula=["75"],
-                    fill=GREEN,
-                ),
-            )
-
-        # ----------------- AUTO COLUMN WIDTHS -----------------
-        for col in range(1, len(headers) + 1):
-            ws.column_dimensions[get_column_letter(col)].width = 22
 
     wb.save(outfile)
     return outfile
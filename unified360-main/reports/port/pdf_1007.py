@@ -1,9 +1,12 @@
 import os
 import tempfile
-from datetime import datetime, timedelta, timezone
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
 
-import matplotlib.pyplot as plt
-import requests
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
 from flask import current_app
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import landscape, A4
@@ -19,88 +22,7 @@ from reportlab.platypus import (
     PageBreak,
 )
 
-# ---------------------------------------------------
-#  TIMEZONES
-# ---------------------------------------------------
-IST = timezone(timedelta(hours=5, minutes=30))
-UTC = timezone.utc
-
-
-# ---------------------------------------------------
-#  DATA FETCH: PORT TIMESERIES
-# ---------------------------------------------------
-def _query_port_timeseries(server, port, start_iso, end_iso, interval):
-    """
-    Query InfluxDB for port response performance.
-
-    Assumptions:
-      - measurement: net_response
-      - response_time is in seconds (float)
-      - result_code = 0 means success; non-zero means failure (we use sum(result_code) ~ failures)
-
-    Returns list of dicts:
-      {
-        "time": IST datetime,
-        "mean_ms": float,
-        "max_ms": float,
-        "attempts": int,
-        "failures": int,
-        "availability": float,
-      }
-    """
-    influx_url = current_app.config["INFLUXDB_URL"]
-    influx_db = current_app.config["INFLUXDB_DB"]
-
-    q = f"""
-    SELECT
-        mean("response_time") AS mean_rt,
-        max("response_time")  AS max_rt,
-        count("result_code")  AS attempts,
-        sum("result_code")    AS failures
-    FROM "net_response"
-    WHERE "server" = '{server}'
-      AND "port" = '{port}'
-      AND time >= '{start_iso}' AND time <= '{end_iso}'
-    GROUP BY time({interval}) fill(null)
-    """
-
-    resp = requests.get(influx_url, params={"db": influx_db, "q": q})
-    data = resp.json()
-
-    rows = []
-    series = data.get("results", [{}])[0].get("series", [])
-    if not series:
-        return rows
-
-    values = series[0].get("values", [])
-
-    for v in values:
-        # v: [time, mean_rt(sec), max_rt(sec), attempts, failures_sum]
-        t_utc = datetime.fromisoformat(v[0].replace("Z", "+00:00"))
-        t_ist = t_utc.astimezone(IST)
-
-        mean_sec = float(v[1] or 0.0)
-        max_sec = float(v[2] or 0.0)
-        attempts = int(v[3] or 0)
-        failures_sum = int(v[4] or 0)
-
-        failures = failures_sum
-        availability = 0.0
-        if attempts > 0:
-            availability = ((attempts - failures) / attempts) * 100.0
-
-        rows.append(
-            {
-                "time": t_ist,
-                "mean_ms": mean_sec * 1000.0,
-                "max_ms": max_sec * 1000.0,
-                "attempts": attempts,
-                "failures": failures,
-                "availability": availability,
-            }
-        )
-
-    return rows
+from .port_data import IST, _parse_iso, _query_port_timeseries_many
 
 
 # ---------------------------------------------------
@@ -136,13 +58,11 @@ def _summary(rows):
 # ---------------------------------------------------
 #  HEADER (Enterprise – Autointelli theme)
 # ---------------------------------------------------
-def _add_header(story, targets_labels, start_iso, end_iso, interval):
-    styles = getSampleStyleSheet()
-    blue = colors.HexColor("#0052CC")
-
-    start_ist = datetime.fromisoformat(start_iso.replace("Z", "+00:00")).astimezone(IST)
-    end_ist = datetime.fromisoformat(end_iso.replace("Z", "+00:00")).astimezone(IST)
-
+def _header_ctx(start_iso, end_iso):
+    """
+    Values shared by every header of one report: parsed once in build_pdf
+    rather than on each per-target page.
+    """
     # Preferred logo path
     logo_path = None
     for p in [
@@ -154,6 +74,22 @@ def _add_header(story, targets_labels, start_iso, end_iso, interval):
             logo_path = p
             break
 
+    return {
+        "start_ist": _parse_iso(start_iso).astimezone(IST),
+        "end_ist": _parse_iso(end_iso).astimezone(IST),
+        "generated": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
+        "logo_path": logo_path,
+    }
+
+
+def _add_header(story, targets_labels, header_ctx, interval):
+    styles = getSampleStyleSheet()
+    blue = colors.HexColor("#0052CC")
+
+    start_ist = header_ctx["start_ist"]
+    end_ist = header_ctx["end_ist"]
+    logo_path = header_ctx["logo_path"]
+
     if logo_path:
         logo = Image(logo_path, width=32 * mm, height=12 * mm)
     else:
@@ -184,7 +120,7 @@ def _add_header(story, targets_labels, start_iso, end_iso, interval):
         f"<b>Targets:</b> {', '.join(targets_labels)}",
         f"<b>Time Range:</b> {start_ist.strftime('%Y-%m-%d %H:%M:%S IST')} → {end_ist.strftime('%Y-%m-%d %H:%M:%S IST')}",
         f"<b>Interval:</b> {interval}",
-        f"<b>Generated:</b> {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}",
+        f"<b>Generated:</b> {header_ctx['generated']}",
         "<i>(All times shown in IST)</i>",
     ]
 
@@ -214,33 +150,106 @@ def _add_header(story, targets_labels, start_iso, end_iso, interval):
 # ---------------------------------------------------
 #  RESPONSE TIME CHART
 # ---------------------------------------------------
-def _build_response_chart(rows, label, interval):
+# chart-local rendering settings: aggressive path simplification and
+# chunked Agg paths keep long series cheap to rasterize at 120 dpi
+_CHART_RC = {
+    "path.simplify": True,
+    "path.simplify_threshold": 1.0,
+    "agg.path.chunksize": 10000,
+}
+
+
+# ~one point per pixel column of a 9in chart at 120 dpi
+_CHART_MAX_POINTS = 1000
+
+
+def _downsample(times, mean_vals, max_vals, max_points=_CHART_MAX_POINTS):
+    """
+    Collapse the series into buckets of equal size: mean of the mean line,
+    max of the max line, bucket start time. Peaks survive; no visible
+    difference at the rendered resolution.
+    """
+    n = len(times)
+    bucket = -(-n // max_points)  # ceil: at most max_points buckets
+    if bucket < 2:
+        return times, mean_vals, max_vals
+
+    t_out, mean_out, max_out = [], [], []
+    for i in range(0, n, bucket):
+        chunk = mean_vals[i:i + bucket]
+        t_out.append(times[i])
+        mean_out.append(sum(chunk) / len(chunk))
+        max_out.append(max(max_vals[i:i + bucket]))
+    return t_out, mean_out, max_out
+
+
+def _build_response_chart(fig, rows, label, interval):
+    """
+    Render one target's response-time chart on `fig` (cleared first) and
+    return the PNG path. The same Figure is reused for every target.
+    """
     if not rows:
         return None
 
     times = [r["time"] for r in rows]
     mean_vals = [r["mean_ms"] for r in rows]
     max_vals = [r["max_ms"] for r in rows]
+    times, mean_vals, max_vals = _downsample(times, mean_vals, max_vals)
+
+    with matplotlib.rc_context(_CHART_RC):
+        fig.clear()
+        ax = fig.add_subplot()
+        ax.plot(times, mean_vals, label="Mean Response (ms)", linewidth=1.1)
+        ax.plot(times, max_vals, label="Max Response (ms)", linewidth=1.1)
+
+        ax.set_title(f"{label} – Response Time ({interval})", fontsize=9)
+        ax.set_ylabel("ms")
+        ax.grid(alpha=0.3)
+        ax.legend(fontsize=7, loc="upper right")
+        fig.autofmt_xdate()
+
+        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
+        fig.savefig(tmp.name, dpi=120, bbox_inches="tight")
+    return tmp.name
 
-    fig, ax = plt.subplots(figsize=(9, 2.6))
-    ax.plot(times, mean_vals, label="Mean Response (ms)", linewidth=1.1)
-    ax.plot(times, max_vals, label="Max Response (ms)", linewidth=1.1)
 
-    ax.set_title(f"{label} – Response Time ({interval})", fontsize=9)
-    ax.set_ylabel("ms")
-    ax.grid(alpha=0.3)
-    ax.legend(fontsize=7, loc="upper right")
-    fig.autofmt_xdate()
+# ---------------------------------------------------
+#  ROW COLOURS
+# ---------------------------------------------------
+ROW_RED = colors.HexColor("#FFCCCC")
+ROW_AMBER = colors.HexColor("#FFDD99")
+ROW_LORANGE = colors.HexColor("#FFF2CC")
+ROW_GREEN = colors.HexColor("#CCFFCC")
+
+
+def _row_bg(mean, avail):
+    bg = colors.white
+
+    # Response time – based on Mean
+    if mean > 1000:
+        bg = ROW_RED
+    elif mean > 500:
+        bg = ROW_AMBER
+    elif mean > 250:
+        bg = ROW_LORANGE
+
+    # Availability overrides latency
+    if avail < 50:
+        bg = ROW_RED
+    elif avail < 75:
+        bg = ROW_AMBER
+    else:
+        bg = ROW_GREEN
 
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-    fig.savefig(tmp.name, dpi=120, bbox_inches="tight")
-    plt.close(fig)
-    return tmp.name
+    return bg
 
 
 # ---------------------------------------------------
 #  BUILD PDF
 # ---------------------------------------------------
+_fmt2 = "{:.2f}".format  # bound once; mapped over whole columns
+
+
 def build_pdf(targets, start, end, interval):
     """
     Build Port Performance PDF (Report 1007) with Autointelli branding.
@@ -284,7 +293,13 @@ def build_pdf(targets, start, end, interval):
     story = []
 
     # Global header
-    _add_header(story, labels, start, end, interval)
+    header_ctx = _header_ctx(start, end)
+    _add_header(story, labels, header_ctx, interval)
+
+    rows_by_target = _query_port_timeseries_many(targets, start, end, interval)
+
+    # one Agg figure per report, cleared between targets
+    chart_fig = Figure(figsize=(9, 2.6))
 
     first = True
     for t in targets:
@@ -294,11 +309,11 @@ def build_pdf(targets, start, end, interval):
             continue
 
         label = f"{server}:{port}"
-        rows = _query_port_timeseries(server, port, start, end, interval)
+        rows = rows_by_target[(server, port)]
 
         if not first:
             story.append(PageBreak())
-            _add_header(story, [label], start, end, interval)
+            _add_header(story, [label], header_ctx, interval)
         first = False
 
         story.append(Paragraph(f"Target: {label}", target_heading))
@@ -334,7 +349,7 @@ def build_pdf(targets, start, end, interval):
         story.append(Spacer(1, 5 * mm))
 
         # Chart
-        chart_path = _build_response_chart(rows, label, interval)
+        chart_path = _build_response_chart(chart_fig, rows, label, interval)
         if chart_path:
             story.append(Image(chart_path, width=250 * mm, height=60 * mm))
             story.append(Spacer(1, 5 * mm))
@@ -351,17 +366,18 @@ def build_pdf(targets, start, end, interval):
             ]
         ]
 
-        for r in rows:
-            table_data.append(
-                [
-                    r["time"].strftime("%Y-%m-%d %H:%M:%S"),
-                    f"{r['mean_ms']:.2f}",
-                    f"{r['max_ms']:.2f}",
-                    r["attempts"],
-                    r["failures"],
-                    f"{r['availability']:.2f}",
-                ]
+        # format column-by-column and zip into rows; isoformat(" ", "seconds")[:19]
+        # gives the same "YYYY-MM-DD HH:MM:SS" as strftime, much cheaper
+        table_data.extend(
+            zip(
+                [r["time"].isoformat(" ", "seconds")[:19] for r in rows],
+                map(_fmt2, map(itemgetter("mean_ms"), rows)),
+                map(_fmt2, map(itemgetter("max_ms"), rows)),
+                map(itemgetter("attempts"), rows),
+                map(itemgetter("failures"), rows),
+                map(_fmt2, map(itemgetter("availability"), rows)),
             )
+        )
 
         tbl = Table(table_data, repeatRows=1)
 
@@ -372,28 +388,12 @@ def build_pdf(targets, start, end, interval):
 
         # Data rows in table_data start at index 1 (0 is header)
         # Columns: 0=Time, 1=Mean, 2=Max, 3=Attempts, 4=Failures, 5=Availability
-        for idx, r in enumerate(rows, start=1):
-            mean = r["mean_ms"]
-            avail = r["availability"]
-            bg = colors.white
-
-            # Response time – based on Mean
-            if mean > 1000:
-                bg = colors.HexColor("#FFCCCC")  # Red
-            elif mean > 500:
-                bg = colors.HexColor("#FFDD99")  # Amber
-            elif mean > 250:
-                bg = colors.HexColor("#FFF2CC")  # Light Orange
-
-            # Availability overrides latency
-            if avail < 50:
-                bg = colors.HexColor("#FFCCCC")  # Red
-            elif avail < 75:
-                bg = colors.HexColor("#FFDD99")  # Amber
-            else:
-                bg = colors.HexColor("#CCFFCC")  # Green
-
-            row_styles.append(("BACKGROUND", (0, idx), (-1, idx), bg))
+        # One BACKGROUND command per run of equally-coloured rows.
+        idx = 1
+        for bg, run in groupby(_row_bg(r["mean_ms"], r["availability"]) for r in rows):
+            n = sum(1 for _ in run)
+            row_styles.append(("BACKGROUND", (0, idx), (-1, idx + n - 1), bg))
+            idx += n
 
         base_style = [
             ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#F3F6FB")),
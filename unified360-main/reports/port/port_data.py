@@ -0,0 +1,184 @@
+# reports/port/port_data.py
+"""
+InfluxDB access for the Port Performance report (1007).
+
+Kept apart from pdf_1007 so the Excel builder can fetch data without
+importing reportlab/matplotlib.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+
+try:
+    from ciso8601 import parse_datetime as _parse_iso  # optional C parser; handles "Z"
+except ImportError:
+    def _parse_iso(s):
+        return datetime.fromisoformat(s.replace("Z", "+00:00"))
+
+from services import ops_cache
+from services.http_utils import influx_json, pooled_session
+
+# ---------------------------------------------------
+#  TIMEZONES
+# ---------------------------------------------------
+_IST_OFFSET = timedelta(hours=5, minutes=30)
+IST = timezone(_IST_OFFSET)
+UTC = timezone.utc
+
+# shared keep-alive pool for Influx queries (sized for the concurrent target fetch)
+_SESSION = pooled_session(pool_connections=16, pool_maxsize=16)
+_TIMEOUT = (3, 30)  # connect, read
+
+
+def _influx_ts_to_ist(s):
+    """
+    Parse an Influx RFC3339 UTC timestamp into an IST datetime.
+    GROUP BY time() buckets are always "YYYY-MM-DDTHH:MM:SSZ"; slice those
+    directly and shift by the fixed IST offset (no astimezone), falling
+    back to the ISO parser for fractional seconds.
+    """
+    if len(s) == 20:
+        return datetime(
+            int(s[0:4]), int(s[5:7]), int(s[8:10]),
+            int(s[11:13]), int(s[14:16]), int(s[17:19]),
+            0, IST,
+        ) + _IST_OFFSET
+    return _parse_iso(s).astimezone(IST)
+
+
+# ---------------------------------------------------
+#  DATA FETCH: PORT TIMESERIES
+# ---------------------------------------------------
+# values are bound via Influx's "params" JSON; only the GROUP BY interval
+# (chosen by rpt_1007._choose_interval, never user text) is formatted in
+PORT_QUERY_TEMPLATE = """
+SELECT
+    mean("response_time") AS mean_rt,
+    max("response_time")  AS max_rt,
+    count("result_code")  AS attempts,
+    sum("result_code")    AS failures
+FROM "net_response"
+WHERE "server" = $server
+  AND "port" = $port
+  AND time >= $start AND time <= $end
+GROUP BY time({interval}) fill(null)
+"""
+
+# cached timeseries are shared between callers: treat them as read-only
+_TS_CACHE_TTL = 120
+
+
+def _query_port_timeseries(server, port, start_iso, end_iso, interval):
+    """
+    Port response timeseries for one target, served from a short-lived
+    cache so a PDF and an Excel run over the same window hit Influx once.
+    See _fetch_port_timeseries for the row shape.
+    """
+    return ops_cache.series.cached(
+        f"rpt1007:ts:{server}:{port}:{start_iso}:{end_iso}:{interval}",
+        _TS_CACHE_TTL,
+        lambda: _fetch_port_timeseries(server, port, start_iso, end_iso, interval),
+    )
+
+
+# concurrent Influx queries per report
+_QUERY_WORKERS = 8
+
+
+def _query_port_timeseries_many(targets, start_iso, end_iso, interval):
+    """
+    Fetch the timeseries of every target with a port concurrently.
+    Returns {(server, port): rows}.
+    """
+    jobs = list(dict.fromkeys(
+        (t["server"], t["port"]) for t in targets if t["port"] is not None
+    ))
+    if not jobs:
+        return {}
+
+    app = current_app._get_current_object()
+
+    def fetch(job):
+        # worker threads have no app context of their own
+        with app.app_context():
+            return _query_port_timeseries(job[0], job[1], start_iso, end_iso, interval)
+
+    with ThreadPoolExecutor(max_workers=min(_QUERY_WORKERS, len(jobs))) as pool:
+        return dict(zip(jobs, pool.map(fetch, jobs)))
+
+
+def _fetch_port_timeseries(server, port, start_iso, end_iso, interval):
+    """
+    Query InfluxDB for port response performance.
+
+    Assumptions:
+      - measurement: net_response
+      - response_time is in seconds (float)
+      - result_code = 0 means success; non-zero means failure (we use sum(result_code) ~ failures)
+
+    Returns list of dicts:
+      {
+        "time": IST datetime,
+        "mean_ms": float,
+        "max_ms": float,
+        "attempts": int,
+        "failures": int,
+        "availability": float,
+      }
+    """
+    influx_url = current_app.config["INFLUXDB_URL"]
+    influx_db = current_app.config["INFLUXDB_DB"]
+
+    q = PORT_QUERY_TEMPLATE.format(interval=interval)
+    bind = {
+        "server": server,
+        "port": str(port),  # "port" is a tag: compare as a string
+        "start": start_iso,
+        "end": end_iso,
+    }
+
+    resp = _SESSION.get(
+        influx_url,
+        params={"db": influx_db, "q": q, "params": json.dumps(bind)},
+        timeout=_TIMEOUT,
+    )
+    # raises on HTTP/Influx errors, so the series cache never stores them
+    data = influx_json(resp)
+
+    rows = []
+    series = data.get("results", [{}])[0].get("series", [])
+    if not series:
+        return rows
+
+    values = series[0].get("values", [])
+    if not values:
+        return rows
+
+    # transpose once: v = [time, mean_rt(sec), max_rt(sec), attempts, failures_sum]
+    t_raw, mean_rt, max_rt, attempts_raw, failures_raw = zip(*values)
+
+    to_ist = _influx_ts_to_ist
+    times = [to_ist(t) for t in t_raw]
+    mean_ms = [float(x or 0.0) * 1000.0 for x in mean_rt]
+    max_ms = [float(x or 0.0) * 1000.0 for x in max_rt]
+    attempts = [int(x or 0) for x in attempts_raw]
+    failures = [int(x or 0) for x in failures_raw]
+    availability = [
+        (a - f) / a * 100.0 if a > 0 else 0.0 for a, f in zip(attempts, failures)
+    ]
+
+    rows = [
+        {
+            "time": t,
+            "mean_ms": mn,
+            "max_ms": mx,
+            "attempts": a,
+            "failures": f,
+            "availability": av,
+        }
+        for t, mn, mx, a, f, av in zip(times, mean_ms, max_ms, attempts, failures, availability)
+    ]
+
+    return rows
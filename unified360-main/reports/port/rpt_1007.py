@@ -1,6 +1,11 @@
 # reports/port/rpt_1007.py
 from datetime import datetime, timezone, timedelta
 
+try:
+    from ciso8601 import parse_datetime as _parse_iso  # optional C parser
+except ImportError:
+    _parse_iso = datetime.fromisoformat
+
 IST = timezone(timedelta(hours=5, minutes=30))
 
 
@@ -11,21 +16,30 @@ def _parse_html_ts(ts_str: str) -> datetime:
     if not ts_str:
         raise ValueError("Missing timestamp")
 
-    fmt = "%Y-%m-%dT%H:%M" if len(ts_str) == 16 else "%Y-%m-%dT%H:%M:%S"
-    local_dt = datetime.strptime(ts_str, fmt)
+    # accepts both "YYYY-MM-DDTHH:MM" and "YYYY-MM-DDTHH:MM:SS"
+    local_dt = _parse_iso(ts_str)
     ist_dt = local_dt.replace(tzinfo=IST)
     return ist_dt.astimezone(timezone.utc)
 
 
+# the chart can't show more and every bucket is a table row + JSON value
+MAX_BUCKETS = 5000
+
+# coarser intervals to escalate to when a long range exceeds MAX_BUCKETS
+_COARSE_INTERVALS = (("1h", 3600), ("6h", 6 * 3600), ("1d", 24 * 3600), ("7d", 7 * 24 * 3600))
+
+
 def _choose_interval(start_dt: datetime, end_dt: datetime) -> str:
     """
     Decide InfluxDB GROUP BY interval based on time range length.
       <= 24h          -> 1m
       >24h & <=72h    -> 5m
       >72h & <=15d    -> 30m
-      >15d            -> 1h
+      >15d            -> 1h, escalated to 6h / 1d / 7d while the range
+                         would still produce more than MAX_BUCKETS buckets
     """
-    delta_hours = (end_dt - start_dt).total_seconds() / 3600.0
+    total_seconds = (end_dt - start_dt).total_seconds()
+    delta_hours = total_seconds / 3600.0
 
     if delta_hours <= 24:
         return "1m"
@@ -33,8 +47,11 @@ def _choose_interval(start_dt: datetime, end_dt: datetime) -> str:
         return "5m"
     elif delta_hours <= 24 * 15:
         return "30m"
-    else:
-        return "1h"
+
+    for interval, seconds in _COARSE_INTERVALS:
+        if total_seconds / seconds <= MAX_BUCKETS:
+            return interval
+    return _COARSE_INTERVALS[-1][0]
 
 
 class PortPerformanceReport:
@@ -57,23 +74,16 @@ class PortPerformanceReport:
         for t in raw_targets:
             if not t:
                 continue
-            if "|" not in t:
-                # fallback – treat entire string as server, port unknown
-                server = t.strip()
-                key = (server, None)
-                if key in seen:
-                    continue
-                seen.add(key)
-                parsed.append({"server": server, "port": None})
-                continue
 
-            server, port_str = t.split("|", 1)
+            # no "|" – treat entire string as server, port unknown
+            server, sep, port_str = t.partition("|")
             server = server.strip()
-            port_str = port_str.strip()
-            try:
-                port = int(port_str)
-            except ValueError:
-                port = None
+            port = None
+            if sep:
+                try:
+                    port = int(port_str)
+                except ValueError:
+                    pass
 
             key = (server, port)
             if key in seen:
@@ -0,0 +1,23 @@
+"""
+PromQL selector helpers shared by the Server Availability (1001) and
+Server Performance (1002) reports.
+"""
+
+import re
+
+
+# instances per `instance=~"a|b|c"` selector – keeps the GET URL short
+INSTANCE_BATCH = 100
+
+# regex metacharacters that can appear in an instance ("host:9100", IPs)
+_RE_META = re.compile(r"([\\.^$|?*+()\[\]{}])")
+
+
+def instance_regex(instances):
+    """
+    Exact-match alternation for a PromQL `instance=~"..."` selector.
+    Prometheus anchors label regexes, so no ^...$ is needed.
+    """
+    alt = "|".join(_RE_META.sub(r"\\\1", i) for i in instances)
+    # inside a PromQL double-quoted string the backslashes need escaping too
+    return alt.replace("\\", "\\\\")
@@ -0,0 +1,90 @@
+"""
+Content-addressed cache for the generated Server Availability report (1001).
+
+Each builder hashes its inputs; when the same report has been built
+before, the stored file is published again instead of being re-rendered.
+Entries live in `<output_dir>/.cache/<key><ext>` and are hard links to
+the published report where the filesystem allows it.
+
+The cache directory survives deploys: bump CACHE_VERSION with any change
+to a cached report's layout so old files are no longer served. Reports
+that stamp their build time (the 1002 performance reports) are not cached.
+"""
+
+import hashlib
+import os
+import shutil
+
+
+# layout version of the cached reports, part of every key
+CACHE_VERSION = 2
+
+# newest entries kept per output directory
+_MAX_ENTRIES = 64
+
+
+def report_key(*parts):
+    # BLAKE2b: fast on short inputs, and collisions are not a concern here
+    return hashlib.blake2b(repr((CACHE_VERSION,) + parts).encode(), digest_size=16).hexdigest()
+
+
+def _cache_path(output_path, key):
+    cache_dir = os.path.join(os.path.dirname(output_path), ".cache")
+    return os.path.join(cache_dir, key + os.path.splitext(output_path)[1])
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.remove(dst)  # leftover .part from an interrupted run
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(src, dst)
+    except OSError:
+        # no hard links on this filesystem
+        shutil.copyfile(src, dst)
+
+
+def restore(output_path, key):
+    """
+    Publish the cached report for `key` at `output_path`.
+    Returns False when nothing is cached under that key.
+    """
+    src = _cache_path(output_path, key)
+    if not os.path.exists(src):
+        return False
+    try:
+        published = os.path.samefile(src, output_path)
+    except FileNotFoundError:
+        published = False
+    # rename() between two links to one file is a no-op, so only link
+    # when the published report is a different file
+    if not published:
+        tmp_file = output_path + ".part"
+        _link_or_copy(src, tmp_file)
+        os.replace(tmp_file, output_path)
+    os.utime(src)  # most recently used survives pruning
+    return True
+
+
+def store(output_path, key):
+    """Keep the just-published `output_path` under `key`."""
+    dst = _cache_path(output_path, key)
+    cache_dir = os.path.dirname(dst)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_file = dst + ".part"
+    _link_or_copy(output_path, tmp_file)
+    os.replace(tmp_file, dst)
+    _prune(cache_dir)
+
+
+def _prune(cache_dir):
+    entries = [e for e in os.scandir(cache_dir) if not e.name.endswith(".part")]
+    if len(entries) <= _MAX_ENTRIES:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    for e in entries[:-_MAX_ENTRIES]:
+        try:
+            os.remove(e.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,56 @@
+"""
+Downtime helpers shared by the Server Availability report (1001):
+rpt_1001 renders minutes as "1 day 2 hrs 5 mins" and the Excel/PDF
+generators parse those strings back into minutes.
+"""
+
+import re
+from functools import lru_cache
+
+
+# downtime tokens in "1 day 2 hrs 5 mins"
+_RE_DAY = re.compile(r"(\d+)\s*day")
+_RE_HR = re.compile(r"(\d+)\s*hr")
+_RE_MIN = re.compile(r"(\d+)\s*min")
+
+
+# ----------- Human Readable Downtime ----------------
+def humanize_minutes(m):
+    try:
+        m = int(m)
+    except (TypeError, ValueError):
+        return "0 mins"
+    return _humanize(m)
+
+
+# most hosts in a window share a downtime (0 above all), so the string is
+# built once per distinct minute count
+@lru_cache(maxsize=4096)
+def _humanize(m):
+    days, m = divmod(m, 1440)
+    hours, minutes = divmod(m, 60)
+
+    parts = []
+    if days > 0: parts.append(f"{days} day{'s' if days > 1 else ''}")
+    if hours > 0: parts.append(f"{hours} hr{'s' if hours > 1 else ''}")
+    if minutes > 0: parts.append(f"{minutes} min{'s' if minutes > 1 else ''}")
+
+    return " ".join(parts) if parts else "0 mins"
+
+
+# ----------- Parse "1 day 2 hrs 10 mins" ----------------
+# servers share a handful of downtime strings ("0 mins" above all), so
+# repeated values are answered from the cache
+@lru_cache(maxsize=4096)
+def parse_minutes(s):
+    if not s or not isinstance(s, str):
+        return 0
+    s = s.lower()
+    mins = 0
+    d = _RE_DAY.search(s)
+    h = _RE_HR.search(s)
+    m = _RE_MIN.search(s)
+    if d: mins += int(d.group(1)) * 1440
+    if h: mins += int(h.group(1)) * 60
+    if m: mins += int(m.group(1))
+    return mins
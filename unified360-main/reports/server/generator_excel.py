@@ -4,11 +4,30 @@ Matching styling & structure of FINAL generator_pdf.py
 """
 
 import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
 from openpyxl.chart import PieChart, Reference
 from openpyxl.utils import get_column_letter
 from datetime import datetime
+from itertools import cycle
 import os
+from heapq import nlargest
+from operator import itemgetter
+
+from ._report_cache import report_key, restore, store
+from ._timeutils import parse_minutes
+
+
+# ----------------------------
+# STYLES (immutable; shared by every cell/sheet)
+# ----------------------------
+_THIN = Side(style="thin", color="1A73E8")
+BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+CENTER = Alignment(horizontal="center")
+TITLE_FONT = Font(size=16, bold=True)
+HEADER_FONT = Font(color="FFFFFF", bold=True)
+FILL_HEADER = PatternFill("solid", fgColor="1A73E8")
+FILL_ALTROW = PatternFill("solid", fgColor="F2F2F2")
 
 
 # ----------------------------
@@ -20,72 +39,59 @@ def build_excel(results, start_ts, end_ts, report_name="Server Availability"):
     os.makedirs(output_dir, exist_ok=True)
 
     excel_path = f"{output_dir}/Server_Availability_Report.xlsx"
+    # saved next to the target and swapped in whole, so a download never
+    # sees a missing or half-written report
+    tmp_file = excel_path + ".part"
+
+    # identical inputs give an identical report: republish the stored copy
+    cache_key = report_key("1001-excel", report_name, start_ts, end_ts, results)
+    if restore(excel_path, cache_key):
+        return excel_path
+
+    # write-only: rows are streamed to the file instead of kept as a cell model
+    wb = openpyxl.Workbook(write_only=True)
 
-    # Remove old file
-    try:
-        if os.path.exists(excel_path):
-            os.remove(excel_path)
-    except:
-        pass
-
-    wb = openpyxl.Workbook()
-
-    # STYLES
-    header_fill = PatternFill("solid", fgColor="1A73E8")
-    header_font = Font(color="FFFFFF", bold=True)
-    border = Border(
-        left=Side(style="thin", color="1A73E8"),
-        right=Side(style="thin", color="1A73E8"),
-        top=Side(style="thin", color="1A73E8"),
-        bottom=Side(style="thin", color="1A73E8"),
-    )
+    # Details data rows carry one named-style reference per cell instead of
+    # separate border/fill assignments (NamedStyles bind to this workbook)
+    wb.add_named_style(NamedStyle(name="detail_even", border=BORDER, fill=FILL_ALTROW))
+    wb.add_named_style(NamedStyle(name="detail_odd", border=BORDER))
 
     # ============================================================
     # 1) SUMMARY SHEET
     # ============================================================
-    ws = wb.active
-    ws.title = "Summary"
+    ws = wb.create_sheet(title="Summary")
 
-    ws["A1"] = "Server Availability Report"
-    ws["A1"].font = Font(size=16, bold=True)
-    ws.merge_cells("A1:F1")
+    title = WriteOnlyCell(ws, value="Server Availability Report")
+    title.font = TITLE_FONT
+    ws.append([title])
+    ws.merged_cells.add("A1:F1")
 
-    ws["A2"] = f"Period: {start_ts.strftime('%Y-%m-%d %H:%M')}  to  {end_ts.strftime('%Y-%m-%d %H:%M')}"
-    ws.merge_cells("A2:F2")
+    ws.append([f"Period: {start_ts.strftime('%Y-%m-%d %H:%M')}  to  {end_ts.strftime('%Y-%m-%d %H:%M')}"])
+    ws.merged_cells.add("A2:F2")
 
     if results:
-        ws["A3"] = f"Customer: {results[0]['customer']}"
+        ws.append([f"Customer: {results[0]['customer']}"])
     else:
-        ws["A3"] = "Customer: All Customers"
-    ws.merge_cells("A3:F3")
+        ws.append(["Customer: All Customers"])
+    ws.merged_cells.add("A3:F3")
 
     ws.append([])
 
     total_servers = len(results)
-    avg_availability = (
-        sum([float(r.get("availability") or 0) for r in results]) / total_servers
-        if total_servers else 0
-    )
-
-    # Convert downtime ("1 day 2 hrs 5 mins") to minutes if possible
-    def parse_minutes(s):
-        import re
-        if not s:
-            return 0
-        s = s.lower()
-        mins = 0
-        d = re.search(r"(\d+)\s*day", s)
-        h = re.search(r"(\d+)\s*hr", s)
-        m = re.search(r"(\d+)\s*min", s)
-        if d: mins += int(d.group(1)) * 1440
-        if h: mins += int(h.group(1)) * 60
-        if m: mins += int(m.group(1))
-        return mins
-
-    avg_downtime = (
-        sum([parse_minutes(r.get("downtime")) for r in results]) / total_servers
-        if total_servers else 0
-    )
+
+    # one pass over results: parse each row's availability and downtime once
+    # into local columns for the ranking and the Details sheet (the caller's
+    # rows are left untouched – they also feed the report cache key)
+    avails = []
+    dt_mins = []
+    for r in results:
+        avails.append(float(r.get("availability") or 0))
+        dt_mins.append(parse_minutes(r.get("downtime")))
+    sum_avail = sum(avails)
+    sum_dt = sum(dt_mins)
+
+    avg_availability = sum_avail / total_servers if total_servers else 0
+    avg_downtime = sum_dt / total_servers if total_servers else 0
 
     ws.append(["Total Servers", total_servers])
     ws.append(["Average Availability (%)", f"{avg_availability:.2f}"])
@@ -95,14 +101,15 @@ def build_excel(results, start_ts, end_ts, report_name="Server Availability"):
     # ------------------------------------------------------------
     # Pie Chart: Availability vs Downtime
     # ------------------------------------------------------------
-    ws.append(["Metric", "Value"])
-    ws.append(["Available %", avg_availability])
-    ws.append(["Downtime %", round(100 - avg_availability, 2)])
+    # write-only sheets don't track max_row: rows 1-8 are written above
+    ws.append(["Metric", "Value"])              # row 9
+    ws.append(["Available %", avg_availability])  # row 10
+    ws.append(["Downtime %", round(100 - avg_availability, 2)])  # row 11
 
     chart = PieChart()
     chart.title = "Overall Availability"
-    data = Reference(ws, min_col=2, min_row=ws.max_row - 1, max_row=ws.max_row)
-    labels = Reference(ws, min_col=1, min_row=ws.max_row - 1, max_row=ws.max_row)
+    data = Reference(ws, min_col=2, min_row=10, max_row=11)
+    labels = Reference(ws, min_col=1, min_row=10, max_row=11)
     chart.add_data(data, titles_from_data=False)
     chart.set_categories(labels)
 
@@ -112,64 +119,63 @@ def build_excel(results, start_ts, end_ts, report_name="Server Availability"):
     ws.append(["Top 10 Downtime Servers"])
     ws.append(["Instance", "Downtime (mins)"])
 
-    # Sort by downtime DESC
-    sorted_dt = sorted(
-        results,
-        key=lambda r: parse_minutes(r.get("downtime")),
-        reverse=True
-    )[:10]
-
-    for r in sorted_dt:
-        ws.append([
-            r["instance"],
-            parse_minutes(r.get("downtime"))
-        ])
+    # Top 10 by downtime DESC – one append per row
+    for mins, r in nlargest(10, zip(dt_mins, results), key=itemgetter(0)):
+        ws.append([r["instance"], mins])
 
     # ============================================================
     # 2) DETAILED DATA SHEET
     # ============================================================
     ws2 = wb.create_sheet(title="Details")
     headers = ["Instance", "Customer", "Availability (%)", "Downtime", "Downtime (mins)"]
-    ws2.append(headers)
 
-    # Apply header style
-    for c in range(1, len(headers) + 1):
-        cell = ws2.cell(row=1, column=c)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal="center")
-        cell.border = border
-
-    for r in results:
-        mins = parse_minutes(r.get("downtime"))
-        ws2.append([
+    # Auto column size – tracked while the rows are built, since write-only
+    # sheets need widths before the first append
+    widths = [len(h) for h in headers]
+    rows = []
+    for r, avail, mins in zip(results, avails, dt_mins):
+        row = [
             r.get("instance"),
             r.get("customer"),
-            float(r.get("availability") or 0),
+            avail,
             r.get("downtime"),
             mins
-        ])
-
-    # Alternate row background
-    for row in ws2.iter_rows(min_row=2):
-        for cell in row:
-            cell.border = border
-        if row[0].row % 2 == 0:
-            for cell in row:
-                cell.fill = PatternFill("solid", fgColor="F2F2F2")
-
-    # Auto column size
-    for col in ws2.columns:
-        max_length = 0
-        col_letter = get_column_letter(col[0].column)
-        for cell in col:
-            if cell.value:
-                max_length = max(max_length, len(str(cell.value)))
-        ws2.column_dimensions[col_letter].width = min(max_length + 2, 50)
+        ]
+        for i, v in enumerate(row):
+            if v:
+                n = len(str(v))
+                if n > widths[i]:
+                    widths[i] = n
+        rows.append(row)
+
+    for i, w in enumerate(widths, start=1):
+        ws2.column_dimensions[get_column_letter(i)].width = min(w + 2, 50)
+
+    # Header row
+    header_cells = []
+    for h in headers:
+        cell = WriteOnlyCell(ws2, value=h)
+        cell.fill = FILL_HEADER
+        cell.font = HEADER_FONT
+        cell.alignment = CENTER
+        cell.border = BORDER
+        header_cells.append(cell)
+    ws2.append(header_cells)
+
+    # Data rows: border on every cell, alternate (even) rows shaded –
+    # the style is picked once per row, starting with row 2
+    for style, row in zip(cycle(("detail_even", "detail_odd")), rows):
+        cells = []
+        for v in row:
+            cell = WriteOnlyCell(ws2, value=v)
+            cell.style = style
+            cells.append(cell)
+        ws2.append(cells)
 
     # ============================================================
     # SAVE
     # ============================================================
-    wb.save(excel_path)
+    wb.save(tmp_file)
+    os.replace(tmp_file, excel_path)
+    store(excel_path, cache_key)
     return excel_path
-
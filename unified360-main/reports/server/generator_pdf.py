@@ -12,68 +12,57 @@ FINAL generator_pdf.py
 
 from reportlab.lib.pagesizes import A4
 from reportlab.platypus import (
-    SimpleDocTemplate, Table, TableStyle,
+    SimpleDocTemplate, Table, LongTable, TableStyle,
     Paragraph, Spacer, Image
 )
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
-import matplotlib.pyplot as plt
 from reportlab.lib.units import inch
-import tempfile
+import io
+import threading
 import os
-import re
 from datetime import datetime
+from functools import lru_cache
 
+from ._report_cache import report_key, restore, store
 
-# ============================================================
-# Humanize minutes
-# ============================================================
-def humanize_minutes(m):
-    try:
-        m = int(m)
-    except:
-        return "0 mins"
-    days = m // 1440
-    m %= 1440
-    hours = m // 60
-    minutes = m % 60
-    parts = []
-    if days: parts.append(f"{days} day{'s' if days != 1 else ''}")
-    if hours: parts.append(f"{hours} hr{'s' if hours != 1 else ''}")
-    if minutes: parts.append(f"{minutes} min{'s' if minutes != 1 else ''}")
-    return " ".join(parts) if parts else "0 mins"
+
+_fmt_pct = "{:.2f}%".format  # bound once; used for every availability cell
 
 
 # ============================================================
-# Parse "1 day 2 hrs 10 mins"
-# ============================================================
-def parse_human_downtime_to_minutes(s):
-    if not s or not isinstance(s, str):
-        return 0
-    s = s.lower()
-    total = 0
+# Build Pie Chart PNG (square → circle)
+_chart_local = threading.local()
 
-    m = re.search(r"(\d+)\s*day", s)
-    if m: total += int(m.group(1)) * 1440
-    m = re.search(r"(\d+)\s*hr", s)
-    if m: total += int(m.group(1)) * 60
-    m = re.search(r"(\d+)\s*min", s)
-    if m: total += int(m.group(1))
-    return total
 
+def _thread_figure():
+    # one Figure per render thread, cleared and redrawn for each report
+    fig = getattr(_chart_local, "fig", None)
+    if fig is None:
+        # matplotlib is imported on the first render, not with the module:
+        # a cached pie never needs it
+        import matplotlib
+        matplotlib.use("Agg")
+        from matplotlib.figure import Figure
 
-# ============================================================
-# Build Pie Chart PNG (square → circle)
-def build_pie_chart_file(availability_pct):
-    up = float(availability_pct)
+        # Square figure ONLY
+        fig = _chart_local.fig = Figure(figsize=(4, 4))
+    return fig
+
+
+@lru_cache(maxsize=128)
+def _pie_chart_png(up):
+    # keyed by availability rounded to the 0.1% the labels show, so
+    # reports with the same average reuse the rendered PNG
     down = max(0.0, 100.0 - up)
 
     labels = ["Available", "Downtime"]
     sizes = [up, down]
     colors_list = ["#28A745", "#DC3545"]  # Green / Red
 
-    # Square figure ONLY
-    fig, ax = plt.subplots(figsize=(4, 4))
+    fig = _thread_figure()
+    fig.clear()
+    ax = fig.add_subplot()
 
     ax.pie(
         sizes,
@@ -88,14 +77,18 @@ def build_pie_chart_file(availability_pct):
 
     # ⭐ IMPORTANT ⭐
     # Remove automatic cropping that makes it non-square
-    plt.tight_layout(pad=1.5)
+    fig.tight_layout(pad=1.5)
 
     # Save exactly as 4x4 inches, NO auto-crop
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-    fig.savefig(tmp.name, dpi=180)   # <-- NO bbox_inches="tight"
+    # (drawn at 180pt in the PDF, so 100 dpi is already ~160 px/inch)
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=100)   # <-- NO bbox_inches="tight"
+    return buf.getvalue()
 
-    plt.close(fig)
-    return tmp.name
+
+def build_pie_chart_png(availability_pct):
+    # in-memory PNG for platypus.Image – nothing lands in /tmp to clean up
+    return io.BytesIO(_pie_chart_png(round(float(availability_pct), 1)))
 
 # ============================================================
 # Logo Location
@@ -105,7 +98,9 @@ PREFERRED_LOGOS = [
     "/usr/local/autointelli/opsduty-server/static/autointelli_logo.png",
 ]
 
+@lru_cache(maxsize=None)
 def select_logo():
+    # the logo is part of the install; look it up once per process
     for p in PREFERRED_LOGOS:
         if os.path.exists(p):
             return p
@@ -121,16 +116,17 @@ def build_pdf(results, start_ts, end_ts, report_name="Server Availability Report
     os.makedirs(output_dir, exist_ok=True)
 
     pdf_path = f"{output_dir}/Server_Availability_Report.pdf"
+    # built next to the target and swapped in whole, so a download never
+    # sees a missing or half-written report
+    tmp_file = pdf_path + ".part"
 
-    # Remove old file if exists
-    try:
-        if os.path.exists(pdf_path):
-            os.remove(pdf_path)
-    except:
-        pass
+    # identical inputs give an identical report: republish the stored copy
+    cache_key = report_key("1001-pdf", report_name, start_ts, end_ts, results)
+    if restore(pdf_path, cache_key):
+        return pdf_path
 
     doc = SimpleDocTemplate(
-        pdf_path,
+        tmp_file,
         pagesize=A4,
         leftMargin=28,
         rightMargin=28,
@@ -205,15 +201,17 @@ def build_pdf(results, start_ts, end_ts, report_name="Server Availability Report
     # ----------------------------------------------------------
     total_servers = len(results)
 
+    # converted once; reused by the detail table below
+    avails = [float(r.get("availability") or 0) for r in results]
+
     avg_avail = 0.0
     if total_servers:
-        avg_avail = sum([float(r.get("availability") or 0) for r in results]) / total_servers
+        avg_avail = sum(avails) / total_servers
 
     # ----------------------------------------------------------
     # PERFECT ROUND PIE CHART (Center, Direct Insert)
     # ----------------------------------------------------------
-    pie_file = build_pie_chart_file(avg_avail)
-    pie_img = Image(pie_file)
+    pie_img = Image(build_pie_chart_png(avg_avail))
     pie_img.hAlign = "CENTER"
 
     # perfect circle (square)
@@ -229,7 +227,7 @@ def build_pdf(results, start_ts, end_ts, report_name="Server Availability Report
     summary_data = [
         ["Metric", "Value"],
         ["Total Servers", str(total_servers)],
-        ["Average Availability (%)", f"{avg_avail:.2f}%"],
+        ["Average Availability (%)", _fmt_pct(avg_avail)],
     ]
 
     summary_table = Table(summary_data, colWidths=[doc.width * 0.4, doc.width * 0.6])
@@ -253,13 +251,15 @@ def build_pdf(results, start_ts, end_ts, report_name="Server Availability Report
 
     table_data = [["Instance", "Customer", "Availability (%)", "Total Downtime"]]
 
-    for r in results:
-        table_data.append([
-            r.get("instance"),
-            r.get("customer"),
-            f"{float(r.get('availability') or 0):.2f}%",
-            r.get("downtime")
-        ])
+    # columns pulled out once and zipped into rows
+    table_data.extend(
+        zip(
+            [r.get("instance") for r in results],
+            [r.get("customer") for r in results],
+            map(_fmt_pct, avails),
+            [r.get("downtime") for r in results],
+        )
+    )
 
     col_widths = [
         doc.width * 0.33,
@@ -268,7 +268,8 @@ def build_pdf(results, start_ts, end_ts, report_name="Server Availability Report
         doc.width * 0.25
     ]
 
-    detail = Table(table_data, colWidths=col_widths, repeatRows=1)
+    # one LongTable; platypus splits it across pages and repeats the header
+    detail = LongTable(table_data, colWidths=col_widths, repeatRows=1, splitByRow=1)
 
     style = TableStyle([
         ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1A73E8")),
@@ -304,6 +305,8 @@ def build_pdf(results, start_ts, end_ts, report_name="Server Availability Report
     # Build PDF
     # ----------------------------------------------------------
     doc.build(elements)
+    os.replace(tmp_file, pdf_path)
+    store(pdf_path, cache_key)
 
     return pdf_path
 
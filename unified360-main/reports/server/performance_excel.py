@@ -1,9 +1,22 @@
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.chart import BarChart, Reference
 from openpyxl.utils import get_column_letter
 import os
 from datetime import datetime
+from heapq import nlargest
+from operator import itemgetter
+
+
+# ---------------------------------------------------
+#  STYLES (immutable; shared by every cell/sheet)
+# ---------------------------------------------------
+CENTER = Alignment(horizontal="center")
+TITLE_FONT = Font(size=16, bold=True)
+HEADER_FONT = Font(color="FFFFFF", bold=True)
+FILL_HEADER = PatternFill("solid", fgColor="1A73E8")
+
 
 def build_excel(results, start_ts, end_ts):
     """
@@ -12,26 +25,33 @@ def build_excel(results, start_ts, end_ts):
     output_dir = "/usr/local/autointelli/opsduty-server/generated_reports"
     os.makedirs(output_dir, exist_ok=True)
     file_path = f"{output_dir}/Server_Performance_Report.xlsx"
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    # saved next to the target and swapped in whole, so a download never
+    # sees a missing or half-written report
+    tmp_file = file_path + ".part"
 
-    wb = openpyxl.Workbook()
+    # write-only: rows are streamed to the file instead of kept as a cell model
+    wb = openpyxl.Workbook(write_only=True)
 
     # --- Summary sheet ---
-    sum_ws = wb.active
-    sum_ws.title = "Summary"
+    sum_ws = wb.create_sheet(title="Summary")
 
-    sum_ws["A1"] = "Server Performance Report"
-    sum_ws["A1"].font = Font(size=16, bold=True)
-    sum_ws.merge_cells("A1:H1")
+    title = WriteOnlyCell(sum_ws, value="Server Performance Report")
+    title.font = TITLE_FONT
+    sum_ws.append([title])
+    sum_ws.merged_cells.add("A1:H1")
 
-    sum_ws["A2"] = f"Period: {start_ts.strftime('%Y-%m-%d %H:%M')} to {end_ts.strftime('%Y-%m-%d %H:%M')}"
-    sum_ws.merge_cells("A2:H2")
+    sum_ws.append([f"Period: {start_ts.strftime('%Y-%m-%d %H:%M')} to {end_ts.strftime('%Y-%m-%d %H:%M')}"])
+    sum_ws.merged_cells.add("A2:H2")
 
     sum_ws.append([])
     total_servers = len(results)
-    avg_cpu = round(sum([r.get("cpu", 0) for r in results]) / total_servers, 2) if total_servers else 0
-    avg_mem = round(sum([r.get("mem", 0) for r in results]) / total_servers, 2) if total_servers else 0
+    sum_cpu = 0.0
+    sum_mem = 0.0
+    for r in results:
+        sum_cpu += r["cpu"]
+        sum_mem += r["mem"]
+    avg_cpu = round(sum_cpu / total_servers, 2) if total_servers else 0
+    avg_mem = round(sum_mem / total_servers, 2) if total_servers else 0
 
     sum_ws.append(["Total Servers", total_servers])
     sum_ws.append(["Average CPU (%)", avg_cpu])
@@ -39,7 +59,7 @@ def build_excel(results, start_ts, end_ts):
     sum_ws.append([])
 
     # Top CPU table
-    top_cpu = sorted(results, key=lambda x: x.get("cpu", 0), reverse=True)[:10]
+    top_cpu = nlargest(10, results, key=itemgetter("cpu"))
     sum_ws.append(["Top CPU Servers"])
     sum_ws.append(["Instance", "CPU (%)"])
     for r in top_cpu:
@@ -51,8 +71,11 @@ def build_excel(results, start_ts, end_ts):
     chart.y_axis.title = "CPU (%)"
     chart.x_axis.title = "Instance"
 
-    data_ref = Reference(sum_ws, min_col=2, min_row= sum_ws.max_row - len(top_cpu) + 1, max_row=sum_ws.max_row)
-    cats_ref = Reference(sum_ws, min_col=1, min_row= sum_ws.max_row - len(top_cpu) + 1, max_row=sum_ws.max_row)
+    # write-only sheets don't track max_row: the top-CPU rows start at row 10
+    first_top_row = 10
+    last_top_row = first_top_row + len(top_cpu) - 1
+    data_ref = Reference(sum_ws, min_col=2, min_row=first_top_row, max_row=last_top_row)
+    cats_ref = Reference(sum_ws, min_col=1, min_row=first_top_row, max_row=last_top_row)
     chart.add_data(data_ref, titles_from_data=False)
     chart.set_categories(cats_ref)
     chart.shape = 4
@@ -61,25 +84,17 @@ def build_excel(results, start_ts, end_ts):
     # --- Data sheet ---
     data_ws = wb.create_sheet(title="Data")
     headers = ["Instance", "Customer", "CPU (%)", "Memory (%)", "Disk Summary", "Disk Read (KB/s)", "Disk Write (KB/s)", "Net Rx (KB/s)", "Net Tx (KB/s)"]
-    data_ws.append(headers)
-    header_fill = PatternFill("solid", fgColor="1A73E8")
-    header_font = Font(color="FFFFFF", bold=True)
-    for col_idx, h in enumerate(headers, 1):
-        c = data_ws.cell(row=4, column=col_idx)  # will move header to row 4 to keep space
-    # write actual header row at row 1 (already appended)
-    for col_idx, h in enumerate(headers, 1):
-        cell = data_ws.cell(row=1, column=col_idx)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal="center")
-
-    # append rows
+
+    # Auto-width columns – tracked while the rows are built, since write-only
+    # sheets need widths before the first append
+    widths = [len(h) for h in headers]
+    rows = []
     for r in results:
         disk_summary = r.get("disk") or ""
         if isinstance(disk_summary, str) and "," in disk_summary:
             # keep combined but also newline-friendly
             disk_summary = "\n".join([p.strip() for p in disk_summary.split(",")])
-        data_ws.append([
+        row = [
             r.get("instance"),
             r.get("customer", ""),
             r.get("cpu", 0),
@@ -89,24 +104,33 @@ def build_excel(results, start_ts, end_ts):
             r.get("disk_write", 0),
             r.get("net_in", 0),
             r.get("net_out", 0)
-        ])
-
-    # Auto-width columns
-    for col in data_ws.columns:
-        max_len = 0
-        col_letter = get_column_letter(col[0].column)
-        for cell in col:
-            try:
-                if cell.value:
-                    max_len = max(max_len, len(str(cell.value)))
-            except:
-                pass
-        data_ws.column_dimensions[col_letter].width = min(60, max_len + 2)
+        ]
+        for i, v in enumerate(row):
+            if v:
+                n = len(str(v))
+                if n > widths[i]:
+                    widths[i] = n
+        rows.append(row)
+
+    for i, w in enumerate(widths, start=1):
+        data_ws.column_dimensions[get_column_letter(i)].width = min(60, w + 2)
+
+    header_cells = []
+    for h in headers:
+        cell = WriteOnlyCell(data_ws, value=h)
+        cell.font = HEADER_FONT
+        cell.fill = FILL_HEADER
+        cell.alignment = CENTER
+        header_cells.append(cell)
+    data_ws.append(header_cells)
+
+    for row in rows:
+        data_ws.append(row)
 
     # Add footer meta in Summary
     sum_ws.append([])
     sum_ws.append([f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"])
 
-    wb.save(file_path)
+    wb.save(tmp_file)
+    os.replace(tmp_file, file_path)
     return file_path
-
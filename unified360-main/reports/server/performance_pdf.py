@@ -1,43 +1,74 @@
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.platypus import (
-    SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak, Flowable
+    SimpleDocTemplate, Paragraph, Spacer, Image, Table, LongTable, TableStyle, PageBreak, Flowable
 )
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.lib.units import inch
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
-import matplotlib.pyplot as plt
-import tempfile
+import io
+import threading
 import os
 from datetime import datetime
+from heapq import nlargest
+from operator import itemgetter
 
 # register a fallback font if available (optional)
 # pdfmetrics.registerFont(TTFont('DejaVu', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'))
 
+_chart_local = threading.local()
+
+
+def _thread_figure():
+    # one Figure per render thread, cleared and redrawn for each chart
+    fig = getattr(_chart_local, "fig", None)
+    if fig is None:
+        # matplotlib is imported on the first chart, not with the module
+        import matplotlib
+        matplotlib.use("Agg")
+        from matplotlib.figure import Figure
+
+        fig = _chart_local.fig = Figure(figsize=(8, 3.5))
+    return fig
+
+
 def _make_bar_chart(data, title, xlabel, ylabel, top_n=10):
     """
-    Creates a single bar chart PNG file and returns path.
+    Creates a single bar chart PNG in memory and returns it as a BytesIO.
     data: list of tuples (label, value)
     """
     if not data:
         return None
-    # sort descending and pick top_n
-    data_sorted = sorted(data, key=lambda x: x[1], reverse=True)[:top_n]
+    # pick top_n, largest first
+    data_sorted = nlargest(top_n, data, key=itemgetter(1))
     labels = [x[0] for x in data_sorted]
     values = [x[1] for x in data_sorted]
 
-    fig, ax = plt.subplots(figsize=(8, 3.5))
+    fig = _thread_figure()
+    fig.clear()
+    ax = fig.add_subplot()
     ax.barh(range(len(values))[::-1], values)  # horizontal bar chart (one plot)
     ax.set_yticks(range(len(values))[::-1])
     ax.set_yticklabels(labels)
     ax.set_xlabel(ylabel)
     ax.set_title(title)
-    plt.tight_layout()
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-    fig.savefig(tmp.name, dpi=160)
-    plt.close(fig)
-    return tmp.name
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=120)
+    buf.seek(0)
+    return buf
+
+_fmt2 = "{:.2f}".format  # bound once; mapped over whole columns
+
+
+def _disk_display(disk_summary):
+    # convert comma separated into multi-line
+    disk_summary = disk_summary or ""
+    if isinstance(disk_summary, str) and "," in disk_summary:
+        return "\n".join([p.strip() for p in disk_summary.split(",")])
+    return str(disk_summary)
+
 
 class PageNumCanvas(Flowable):
     def __init__(self, width):
@@ -66,14 +97,12 @@ def build_pdf(results, start_ts, end_ts, cust, report_name="Server Performance")
     output_dir = "/usr/local/autointelli/opsduty-server/generated_reports"
     os.makedirs(output_dir, exist_ok=True)
     pdf_path = f"{output_dir}/Server_Performance_Report.pdf"
-    try:
-        if os.path.exists(pdf_path):
-            os.remove(pdf_path)
-    except:
-        pass
+    # built next to the target and swapped in whole, so a download never
+    # sees a missing or half-written report
+    tmp_file = pdf_path + ".part"
 
     doc = SimpleDocTemplate(
-        pdf_path,
+        tmp_file,
         pagesize=landscape(A4),
         leftMargin=28,
         rightMargin=28,
@@ -109,10 +138,18 @@ def build_pdf(results, start_ts, end_ts, cust, report_name="Server Performance")
 
     # --- Executive summary ---
     total_servers = len(results)
-    avg_cpu = round(sum([r.get("cpu", 0) for r in results]) / total_servers, 2) if total_servers else 0
-    avg_mem = round(sum([r.get("mem", 0) for r in results]) / total_servers, 2) if total_servers else 0
-    top_cpu = sorted(results, key=lambda x: x.get("cpu", 0), reverse=True)[:5]
-    top_mem = sorted(results, key=lambda x: x.get("mem", 0), reverse=True)[:5]
+    sum_cpu = 0.0
+    sum_mem = 0.0
+    for r in results:
+        sum_cpu += r["cpu"]
+        sum_mem += r["mem"]
+    avg_cpu = round(sum_cpu / total_servers, 2) if total_servers else 0
+    avg_mem = round(sum_mem / total_servers, 2) if total_servers else 0
+    # rpt_1002 fills every metric key, so plain itemgetter keys are safe
+    # one selection serves both the top-5 list and the 8-bar CPU chart
+    top8_cpu = nlargest(8, results, key=itemgetter("cpu"))
+    top_cpu = top8_cpu[:5]
+    top_mem = nlargest(5, results, key=itemgetter("mem"))
 
     exec_lines = [
         [Paragraph("<b>Executive Summary</b>", header_style), ""],
@@ -142,8 +179,9 @@ def build_pdf(results, start_ts, end_ts, cust, report_name="Server Performance")
     elements.append(Spacer(1, 12))
 
     # --- Charts: Top CPU and Top Disk Read ---
-    cpu_chart_data = [(r["instance"], r["cpu"]) for r in sorted(results, key=lambda x: x.get("cpu", 0), reverse=True)]
-    diskr_chart_data = [(r["instance"], r.get("disk_read", 0)) for r in sorted(results, key=lambda x: x.get("disk_read", 0), reverse=True)]
+    # _make_bar_chart picks its own top_n, so the inputs need no pre-sort
+    cpu_chart_data = [(r["instance"], r["cpu"]) for r in top8_cpu]
+    diskr_chart_data = [(r["instance"], r["disk_read"]) for r in results]
 
     cpu_png = _make_bar_chart(cpu_chart_data, "Top CPU Consumers", "Instance", "CPU (%)", top_n=8)
     diskr_png = _make_bar_chart(diskr_chart_data, "Top Disk Read (KB/s)", "Instance", "KB/s", top_n=8)
@@ -159,27 +197,23 @@ def build_pdf(results, start_ts, end_ts, cust, report_name="Server Performance")
         ["Instance", "CPU %", "Memory %", "Disk Summary", "Read KB/s", "Write KB/s", "Net Rx KB/s", "Net Tx KB/s"]
     ]
 
-    # build table rows with tidy disk multiline
-    for r in results:
-        disk_summary = r.get("disk") or ""
-        # convert comma separated into multi-line
-        if isinstance(disk_summary, str) and "," in disk_summary:
-            parts = [p.strip() for p in disk_summary.split(",")]
-            disk_display = "\n".join(parts)
-        else:
-            disk_display = str(disk_summary)
-
-        row = [
-            r.get("instance"),
-            f"{r.get('cpu', 0):.2f}",
-            f"{r.get('mem', 0):.2f}",
-            disk_display,
-            f"{r.get('disk_read', 0):.2f}",
-            f"{r.get('disk_write', 0):.2f}",
-            f"{r.get('net_in', 0):.2f}",
-            f"{r.get('net_out', 0):.2f}"
-        ]
-        table_data.append(row)
+    # pull each metric out as its own column once, format column-by-column
+    # (one map per column) and zip into rows – tidy disk multiline included
+    def col(key):
+        return map(itemgetter(key), results)
+
+    table_data.extend(
+        zip(
+            [r.get("instance") for r in results],
+            map(_fmt2, col("cpu")),
+            map(_fmt2, col("mem")),
+            map(_disk_display, col("disk")),
+            map(_fmt2, col("disk_read")),
+            map(_fmt2, col("disk_write")),
+            map(_fmt2, col("net_in")),
+            map(_fmt2, col("net_out")),
+        )
+    )
 
     col_widths = [
         doc.width * 0.18,  # instance
@@ -192,7 +226,8 @@ def build_pdf(results, start_ts, end_ts, cust, report_name="Server Performance")
         doc.width * 0.07
     ]
 
-    detail_table = Table(table_data, colWidths=col_widths, repeatRows=1)
+    # one LongTable; platypus splits it across pages and repeats the header
+    detail_table = LongTable(table_data, colWidths=col_widths, repeatRows=1, splitByRow=1)
     # style
     style = TableStyle([
         ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1A73E8")),
@@ -221,11 +256,7 @@ def build_pdf(results, start_ts, end_ts, cust, report_name="Server Performance")
 
     # build doc
     doc.build(elements)
-
-    # cleanup chart files
-    for p in (cpu_png, diskr_png):
-        if p and os.path.exists(p):
-            os.remove(p)
+    os.replace(tmp_file, pdf_path)
 
     return pdf_path
 
@@ -1,23 +1,26 @@
-import requests
 from datetime import datetime
 
+from services import ops_cache
+from services.http_utils import pooled_session, prometheus_json
+
+from ._promql import INSTANCE_BATCH, instance_regex
+from ._report_cache import report_key
+from ._timeutils import humanize_minutes
+
 PROM_URL = "http://localhost:9090"
 INTERVAL = 60  # Alloy pushes 1/min
 
+# keep-alive pool shared by every report run (requests already asks for
+# gzip, so Prometheus responses come back compressed)
+_SESSION = pooled_session(pool_connections=16, pool_maxsize=32, retries=2, backoff_factor=0.2)
+_TIMEOUT = (3, 30)  # connect, read
 
-# ----------- Human Readable Downtime ----------------
-def humanize_minutes(m):
-    days = m // 1440
-    m %= 1440
-    hours = m // 60
-    minutes = m % 60
-
-    parts = []
-    if days > 0: parts.append(f"{days} day{'s' if days>1 else ''}")
-    if hours > 0: parts.append(f"{hours} hr{'s' if hours>1 else ''}")
-    if minutes > 0: parts.append(f"{minutes} min{'s' if minutes>1 else ''}")
+# host inventory changes rarely; shared read-only between report runs
+_INVENTORY_TTL = 300
 
-    return " ".join(parts) if parts else "0 mins"
+# sample counts, so the Excel and PDF downloads of one window share a
+# single round of Prometheus queries
+_COUNTS_TTL = 120
 
 
 class ServerAvailabilityReport:
@@ -26,11 +29,14 @@ class ServerAvailabilityReport:
     # Fetch all instances + hostnames + customer name
     # ----------------------------------------------------
     def get_all_instances(self):
+        return ops_cache.cached("rpt1001:inventory", _INVENTORY_TTL, self._fetch_all_instances)
+
+    def _fetch_all_instances(self):
         inst_map = {}   # instance → {hostname, customer, type}
 
         # Linux hostname + customer
         q_linux = "node_uname_info"
-        r = requests.get(f"{PROM_URL}/api/v1/query", params={"query": q_linux}).json()
+        r = prometheus_json(_SESSION.get(f"{PROM_URL}/api/v1/query", params={"query": q_linux}, timeout=_TIMEOUT))
         for row in r["data"]["result"]:
             inst = row["metric"].get("instance")
             hostname = row["metric"].get("nodename")
@@ -44,7 +50,7 @@ class ServerAvailabilityReport:
 
         # Windows hostname + customer
         q_win = "windows_cs_hostname"
-        r = requests.get(f"{PROM_URL}/api/v1/query", params={"query": q_win}).json()
+        r = prometheus_json(_SESSION.get(f"{PROM_URL}/api/v1/query", params={"query": q_win}, timeout=_TIMEOUT))
         for row in r["data"]["result"]:
             inst = row["metric"].get("instance")
             hostname = row["metric"].get("hostname")
@@ -59,17 +65,39 @@ class ServerAvailabilityReport:
         return inst_map  # instance → {hostname, customer, type}
 
     # ----------------------------------------------------
-    # Sample count (Linux or Windows)
+    # Sample counts (Linux or Windows), one query per batch
     # ----------------------------------------------------
-    def count_samples(self, inst, minutes, os_type):
+    def count_samples(self, instances, minutes, os_type):
+        """
+        {instance: samples in the window} for instances of one OS family.
+        Instances without data are left out (callers treat them as 0).
+        """
         metric = "node_time_seconds" if os_type == "linux" else "windows_os_time"
-        query = f'count_over_time({metric}{{instance="{inst}"}}[{minutes}m])'
-
-        r = requests.get(f"{PROM_URL}/api/v1/query", params={"query": query}).json()
-        try:
-            return int(float(r["data"]["result"][0]["value"][1]))
-        except:
-            return 0
+        counts = {}
+
+        for n in range(0, len(instances), INSTANCE_BATCH):
+            sel = instance_regex(instances[n:n + INSTANCE_BATCH])
+            query = f'count_over_time({metric}{{instance=~"{sel}"}}[{minutes}m])'
+
+            # raises on HTTP/Prometheus errors: a failed query must not turn
+            # into 0% availability for every host (and be cached as such)
+            r = prometheus_json(_SESSION.get(f"{PROM_URL}/api/v1/query", params={"query": query}, timeout=_TIMEOUT))
+            for row in r["data"]["result"]:
+                try:
+                    # first series per instance, as the single-host query used
+                    counts.setdefault(row["metric"]["instance"], int(float(row["value"][1])))
+                except (KeyError, IndexError, TypeError, ValueError):
+                    pass
+        return counts
+
+    def count_all_samples(self, inst_map, minutes):
+        # one vector query per OS family instead of one per host
+        counts = {}
+        for os_type in ("linux", "windows"):
+            insts = [i for i, meta in inst_map.items() if meta["type"] == os_type]
+            if insts:
+                counts.update(self.count_samples(insts, minutes, os_type))
+        return counts
 
     # ----------------------------------------------------
     # Main Report Logic
@@ -94,10 +122,18 @@ class ServerAvailabilityReport:
             else:
                 return None  # no matching host
 
+        counts = ops_cache.cached(
+            "rpt1001:counts:" + report_key(
+                sorted((i, meta["type"]) for i, meta in all_map.items()), start_ts, minutes
+            ),
+            _COUNTS_TTL,
+            lambda: self.count_all_samples(all_map, minutes),
+        )
+
         results = []
 
         for inst, meta in all_map.items():
-            rec = self.count_samples(inst, minutes, meta["type"])
+            rec = counts.get(inst, 0)
             availability = (rec / expected) * 100 if expected else 0
             downtime = expected - rec
 
@@ -1,14 +1,52 @@
-from prometheus_api_client import PrometheusConnect, MetricRangeDataFrame
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import pandas as pd
-import requests
+from math import fsum
+
+from services import ops_cache
+from services.http_utils import pooled_session, prometheus_json
+
+from ._promql import INSTANCE_BATCH, instance_regex
+from ._report_cache import report_key
 
 PROM_URL = "http://localhost:9090"
 
-class ServerPerformanceReport:
+# host inventory changes rarely; shared read-only between report runs
+_INVENTORY_TTL = 300
+
+# collected metrics, so the Excel and PDF downloads of one window share
+# a single round of Prometheus queries
+_COLLECT_TTL = 120
+
+# batched range queries run concurrently, over one keep-alive pool
+# (requests already asks for gzip, so responses come back compressed)
+_QUERY_WORKERS = 8
+_SESSION = pooled_session(pool_connections=16, pool_maxsize=32, retries=2, backoff_factor=0.2)
+_TIMEOUT = (3, 30)  # connect, read
+
+
+def _series_means(series, *labels):
+    """
+    Mean of every sample in a Prometheus range result, grouped by `labels`
+    across all series – what DataFrame.groupby(labels)["value"].mean()
+    gave, without building the frame. Series missing a label and NaN
+    samples are skipped. Returns {(label values...): mean}.
+    """
+    acc = {}  # key -> [sum, count]
+    for s in series:
+        metric = s.get("metric", {})
+        try:
+            key = tuple(metric[l] for l in labels)
+        except KeyError:
+            continue
+        vals = [v for v in (float(p[1]) for p in s.get("values", ())) if v == v]
+        if vals:
+            t = acc.setdefault(key, [0.0, 0])
+            t[0] += fsum(vals)
+            t[1] += len(vals)
+    return {k: t[0] / t[1] for k, t in acc.items()}
 
-    def __init__(self):
-        self.prom = PrometheusConnect(url=PROM_URL, disable_ssl=True)
+
+class ServerPerformanceReport:
 
     # ------------------------------
     # Helper: Convert iso → datetime
@@ -16,20 +54,23 @@ class ServerPerformanceReport:
     def to_dt(self, s):
         return datetime.fromisoformat(s)
 
-    # ------------------------------
-    # Helper: safe average from dataframe
-    # ------------------------------
-    def safe_avg(self, df):
-        try:
-            return float(df['value'].mean())
-        except:
-            return 0.0
-
     # ------------------------------
     # Detect available instances
     # ------------------------------
     def get_all_instances(self, customer):
+        key = f"rpt1002:inventory:{customer}"
+        inst_map = ops_cache.get(key)
+        if inst_map is None:
+            inst_map, complete = self._fetch_all_instances(customer)
+            # a failed lookup leaves the map partial: don't pin that
+            if complete:
+                ops_cache.set_value(key, inst_map, ttl_seconds=_INVENTORY_TTL)
+        return inst_map
+
+    def _fetch_all_instances(self, customer):
+        """Returns (inst_map, complete); complete is False when a lookup failed."""
         inst_map = {}
+        complete = True
 
         # ----------------------------------
         # Linux instances via raw /series
@@ -44,9 +85,9 @@ class ServerPerformanceReport:
                 params={
                     "match[]": f'node_uname_info{{CustomerName="{customer}"}}'
                 }
-            r = requests.get(
+            r = prometheus_json(_SESSION.get(
                 f"{PROM_URL}/api/v1/series",
-                params=params).json()
+                params=params, timeout=_TIMEOUT))
 
             for row in r.get("data", []):
                 inst = row.get("instance")
@@ -55,6 +96,7 @@ class ServerPerformanceReport:
 
         except Exception as e:
             print("Linux series error:", e)
+            complete = False
 
         # ----------------------------------
         # Windows instances
@@ -69,10 +111,11 @@ class ServerPerformanceReport:
                 params={
                     "match[]": f'windows_os_info{{CustomerName="{customer}"}}'
                 }
-            r = requests.get(
+            r = prometheus_json(_SESSION.get(
                 f"{PROM_URL}/api/v1/series",
-                params=params
-            ).json()
+                params=params,
+                timeout=_TIMEOUT
+            ))
 
             for row in r.get("data", []):
                 inst = row.get("instance")
@@ -81,28 +124,36 @@ class ServerPerformanceReport:
 
         except Exception as e:
             print("Windows series error:", e)
+            complete = False
 
-        return inst_map
+        return inst_map, complete
 
 
     # ------------------------------
-    # Run a range query and return dataframe
+    # Run a range query and return its series
     # ------------------------------
     def q(self, query, start, end):
+        """
+        Raw Prometheus matrix: [{"metric": {...}, "values": [[ts, "v"], ...]}],
+        or None when the query failed.
+        Averaging a few hundred floats doesn't need a DataFrame.
+        """
         try:
             step = self.choose_step(start, end)
-            data = self.prom.custom_query_range(
-                query=query,
-                start_time=start,
-                end_time=end,
-                step=step
+            r = _SESSION.get(
+                f"{PROM_URL}/api/v1/query_range",
+                params={
+                    "query": query,
+                    "start": round(start.timestamp()),
+                    "end": round(end.timestamp()),
+                    "step": step,
+                },
+                timeout=_TIMEOUT
             )
-            df = MetricRangeDataFrame(data)
-            print(df)
-            return df
+            return prometheus_json(r)["data"]["result"]
         except Exception as e:
             print(str(e))
-            return pd.DataFrame()
+            return None
 
     def choose_step(self, start_dt, end_dt):
         seconds = (end_dt - start_dt).total_seconds()
@@ -118,107 +169,94 @@ class ServerPerformanceReport:
         else:
             return "3h"      # 3 hours
     # ------------------------------
-    # Disk usage per mount (Linux)
+    # Batched PromQL: one query per metric per OS family
     # ------------------------------
-    def linux_disk_usage(self, inst, start, end):
-        query = (
-            f'(100 - ((node_filesystem_avail_bytes{{instance="{inst}",fstype!~"tmpfs|overlay"}} * 100)'
-            f' / node_filesystem_size_bytes{{instance="{inst}",fstype!~"tmpfs|overlay"}}))'
-        )
-
-        df = self.q(query, start, end)
-        if df.empty:
-            return "N/A"
-
-        disk_map = {}
-        for mnt in df['mountpoint'].unique():
-            mdf = df[df['mountpoint'] == mnt]
-            disk_map[mnt] = round(self.safe_avg(mdf), 2)
-
-        return ", ".join([f"{k}={v}%" for k, v in disk_map.items()])
-
-    # ------------------------------
-    # Disk usage per volume (Windows)
-    # ------------------------------
-    def windows_disk_usage(self, inst, start, end):
-        query = (
-            f'(100 - ((windows_logical_disk_free_megabytes{{instance="{inst}"}} * 1048576 * 100)'
-            f' / windows_logical_disk_size_bytes{{instance="{inst}"}}))'
-        )
-
-        df = self.q(query, start, end)
-        if df.empty:
-            return "N/A"
-
-        disk_map = {}
-        for vol in df['metric.volume'].unique():
-            mdf = df[df['metric.volume'] == vol]
-            disk_map[vol] = round(self.safe_avg(mdf), 2)
-
-        return ", ".join([f"{k}={v}%" for k, v in disk_map.items()])
-
-    # ------------------------------
-    # Disk R/W
-    # ------------------------------
-    def disk_rw(self, inst, start, end, os_type):
+    def metric_queries(self, os_type, sel):
+        """
+        sel: instance regex for `instance=~"..."`, covering a batch of
+        instances of one OS family. Returns {metric_key: promql}; every
+        query keeps the instance label so results split per instance.
+        """
         if os_type == "linux":
-            read_q = f'rate(node_disk_read_bytes_total{{instance="{inst}"}}[5m])'
-            write_q = f'rate(node_disk_written_bytes_total{{instance="{inst}"}}[5m])'
-        else:
-            read_q = f'rate(windows_logical_disk_read_bytes_total{{instance="{inst}"}}[5m])'
-            write_q = f'rate(windows_logical_disk_write_bytes_total{{instance="{inst}"}}[5m])'
-
-        df_r = self.q(read_q, start, end)
-        df_w = self.q(write_q, start, end)
-
-        read_kb = self.safe_avg(df_r) / 1024
-        write_kb = self.safe_avg(df_w) / 1024
-
-        return round(read_kb, 2), round(write_kb, 2)
-
-    # ------------------------------
-    # Network R/T
-    # ------------------------------
-    def net_io(self, inst, start, end):
-        rx_q = f'rate(node_network_receive_bytes_total{{instance="{inst}"}}[5m])'
-        tx_q = f'rate(node_network_transmit_bytes_total{{instance="{inst}"}}[5m])'
-
-        df_rx = self.q(rx_q, start, end)
-        df_tx = self.q(tx_q, start, end)
-
-        rx = self.safe_avg(df_rx) / 1024
-        tx = self.safe_avg(df_tx) / 1024
-
-        return round(rx, 2), round(tx, 2)
+            return {
+                "cpu": (
+                    f'100 - (avg by (instance) (rate(node_cpu_seconds_total{{instance=~"{sel}",mode="idle"}}[5m])) * 100)'
+                ),
+                "mem": (
+                    f'(1 - (node_memory_MemAvailable_bytes{{instance=~"{sel}"}} / '
+                    f'node_memory_MemTotal_bytes{{instance=~"{sel}"}})) * 100'
+                ),
+                "disk": (
+                    f'(100 - ((node_filesystem_avail_bytes{{instance=~"{sel}",fstype!~"tmpfs|overlay"}} * 100)'
+                    f' / node_filesystem_size_bytes{{instance=~"{sel}",fstype!~"tmpfs|overlay"}}))'
+                ),
+                "disk_read": f'rate(node_disk_read_bytes_total{{instance=~"{sel}"}}[5m])',
+                "disk_write": f'rate(node_disk_written_bytes_total{{instance=~"{sel}"}}[5m])',
+                "net_in": f'rate(node_network_receive_bytes_total{{instance=~"{sel}"}}[5m])',
+                "net_out": f'rate(node_network_transmit_bytes_total{{instance=~"{sel}"}}[5m])',
+            }
+        return {
+            "cpu": (
+                f'100 - (avg by (instance) (rate(windows_cpu_time_total{{instance=~"{sel}",mode="idle"}}[5m])) * 100)'
+            ),
+            "mem": (
+                f'(1 - (windows_memory_available_bytes{{instance=~"{sel}"}} / '
+                f'windows_memory_commit_limit_bytes{{instance=~"{sel}"}})) * 100'
+            ),
+            "disk": (
+                f'(100 - ((windows_logical_disk_free_megabytes{{instance=~"{sel}"}} * 1048576 * 100)'
+                f' / windows_logical_disk_size_bytes{{instance=~"{sel}"}}))'
+            ),
+            "disk_read": f'rate(windows_logical_disk_read_bytes_total{{instance=~"{sel}"}}[5m])',
+            "disk_write": f'rate(windows_logical_disk_write_bytes_total{{instance=~"{sel}"}}[5m])',
+            # node_* network series, as before – Windows hosts report 0
+            "net_in": f'rate(node_network_receive_bytes_total{{instance=~"{sel}"}}[5m])',
+            "net_out": f'rate(node_network_transmit_bytes_total{{instance=~"{sel}"}}[5m])',
+        }
 
     # ------------------------------
-    # CPU / Memory
+    # Query every metric for every instance
     # ------------------------------
-    def cpu_mem(self, inst, start, end, os_type):
-        if os_type == "linux":
-            cpu_q = (
-                f'100 - (avg(rate(node_cpu_seconds_total{{instance="{inst}",mode="idle"}}[5m])) * 100)'
-            )
-            mem_q = (
-                f'(1 - (node_memory_MemAvailable_bytes{{instance="{inst}"}} / '
-                f'node_memory_MemTotal_bytes{{instance="{inst}"}})) * 100'
-            )
+    def collect(self, inst_map, start_dt, end_dt):
+        """
+        Returns (avg, disk, complete):
+          avg:  {(metric_key, instance): mean value}
+          disk: {instance: {mountpoint/volume: mean used %}}
+          complete: False when any query failed
+        """
+        jobs = []  # (os_type, metric_key, promql)
+        for os_type in ("linux", "windows"):
+            insts = [i for i, meta in inst_map.items() if meta["type"] == os_type]
+            for n in range(0, len(insts), INSTANCE_BATCH):
+                sel = instance_regex(insts[n:n + INSTANCE_BATCH])
+                for key, promql in self.metric_queries(os_type, sel).items():
+                    jobs.append((os_type, key, promql))
+
+        # the queries are network-bound: run them side by side so wall
+        # time tracks the slowest query, not the sum
+        def run_query(job):
+            return self.q(job[2], start_dt, end_dt)
+
+        if len(jobs) < 2:
+            results = [run_query(job) for job in jobs]
         else:
-            cpu_q = (
-                f'100 - (avg(rate(windows_cpu_time_total{{instance="{inst}",mode="idle"}}[5m])) * 100)'
-            )
-            mem_q = (
-                f'(1 - (windows_memory_available_bytes{{instance="{inst}"}} / '
-                f'windows_memory_commit_limit_bytes{{instance="{inst}"}})) * 100'
-            )
-
-        df_cpu = self.q(cpu_q, start, end)
-        df_mem = self.q(mem_q, start, end)
-
-        cpu = round(self.safe_avg(df_cpu), 2)
-        mem = round(self.safe_avg(df_mem), 2)
-
-        return cpu, mem
+            with ThreadPoolExecutor(max_workers=min(len(jobs), _QUERY_WORKERS)) as pool:
+                results = list(pool.map(run_query, jobs))
+
+        avg = {}
+        disk = {}
+        complete = None not in results
+        for (os_type, key, _), series in zip(jobs, results):
+            if not series:
+                continue
+            if key == "disk":
+                label = "mountpoint" if os_type == "linux" else "volume"
+                for (inst, mnt), v in _series_means(series, "instance", label).items():
+                    disk.setdefault(inst, {})[mnt] = round(v, 2)
+            else:
+                for (inst,), v in _series_means(series, "instance").items():
+                    avg[(key, inst)] = v
+        return avg, disk, complete
 
     # ------------------------------
     # MAIN ENTRY
@@ -240,31 +278,33 @@ class ServerPerformanceReport:
                 # cannot find exact instance
                 return None
 
-        results = []
-        for inst, meta in inst_map.items():
-
-            os_type = meta["type"]
-
-            cpu, mem = self.cpu_mem(inst, start_dt, end_dt, os_type)
-
-            if os_type == "linux":
-                disk = self.linux_disk_usage(inst, start_dt, end_dt)
-            else:
-                disk = self.windows_disk_usage(inst, start_dt, end_dt)
-
-            r_kb, w_kb = self.disk_rw(inst, start_dt, end_dt, os_type)
+        cache_key = "rpt1002:collect:" + report_key(
+            sorted((i, meta["type"]) for i, meta in inst_map.items()), start_dt, end_dt
+        )
+        cached = ops_cache.get(cache_key)
+        if cached is None:
+            avg, disk, complete = self.collect(inst_map, start_dt, end_dt)
+            # a failed query would pin zeros for the whole TTL
+            if complete:
+                ops_cache.set_value(cache_key, (avg, disk), ttl_seconds=_COLLECT_TTL)
+        else:
+            avg, disk = cached
 
-            rx, tx = self.net_io(inst, start_dt, end_dt)
+        def mean(key, inst):
+            return avg.get((key, inst), 0.0)
 
+        results = []
+        for inst in inst_map:
+            disk_map = disk.get(inst)
             results.append({
                 "instance": inst,
-                "cpu": cpu,
-                "mem": mem,
-                "disk": disk,
-                "disk_read": r_kb,
-                "disk_write": w_kb,
-                "net_in": rx,
-                "net_out": tx,
+                "cpu": round(mean("cpu", inst), 2),
+                "mem": round(mean("mem", inst), 2),
+                "disk": ", ".join([f"{k}={v}%" for k, v in disk_map.items()]) if disk_map else "N/A",
+                "disk_read": round(mean("disk_read", inst) / 1024, 2),
+                "disk_write": round(mean("disk_write", inst) / 1024, 2),
+                "net_in": round(mean("net_in", inst) / 1024, 2),
+                "net_out": round(mean("net_out", inst) / 1024, 2),
             })
 
         if fmt == "excel":
@@ -273,4 +313,3 @@ class ServerPerformanceReport:
 
         from .performance_pdf import build_pdf
         return build_pdf(results, start_dt, end_dt, customer)
-
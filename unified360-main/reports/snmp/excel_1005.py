@@ -1,9 +1,11 @@
 import os
 import tempfile
 from datetime import datetime
+from itertools import cycle
 
 import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
 from openpyxl.utils import get_column_letter
 from openpyxl.chart import LineChart, Reference
 from openpyxl.chart.axis import DateAxis
@@ -13,10 +15,52 @@ from flask import current_app
 from .pdf_1005 import (
     IST,
     _INTERVAL_SECONDS,
-    _format_bytes,
-    _format_speed_kbps,
+    _format_table_columns,
 )
-from .pdf_1005 import _query_interface_timeseries
+from .pdf_1005 import _query_interfaces_timeseries
+
+
+# ----------------------------
+# STYLES (immutable; shared by every cell/sheet)
+# ----------------------------
+_THIN = Side(border_style="thin", color="999999")
+BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+CENTER = Alignment(horizontal="center")
+BOLD_FONT = Font(bold=True)
+TITLE_FONT = Font(size=14, bold=True)
+FILL_HEADER = PatternFill("solid", fgColor="DCE6F7")
+FILL_ALTROW = PatternFill("solid", fgColor="F7FAFF")
+TIME_FORMAT = "yyyy-mm-dd hh:mm:ss"
+
+HEADERS = [
+    "Time (IST)",
+    "Traffic Total (Volume)",
+    "Traffic Total (Speed)",
+    "Traffic In (Volume)",
+    "Traffic In (Speed)",
+    "Traffic Out (Volume)",
+    "Traffic Out (Speed)",
+]
+
+
+def _add_data_styles(wb):
+    # data rows carry one named-style reference per cell instead of separate
+    # border/fill/alignment assignments (NamedStyles bind to this workbook);
+    # the first data row (sheet row 11) is plain, the next one shaded
+    for parity, fill in (("odd", PatternFill()), ("even", FILL_ALTROW)):
+        wb.add_named_style(NamedStyle(
+            name=f"data_{parity}", border=BORDER, fill=fill, alignment=CENTER,
+        ))
+        wb.add_named_style(NamedStyle(
+            name=f"time_{parity}", border=BORDER, fill=fill, alignment=CENTER,
+            number_format=TIME_FORMAT,
+        ))
+
+
+def _bold_cell(ws, value, font=BOLD_FONT):
+    c = WriteOnlyCell(ws, value=value)
+    c.font = font
+    return c
 
 
 def build_excel(template_type, device, interfaces, start, end, interval):
@@ -25,17 +69,16 @@ def build_excel(template_type, device, interfaces, start, end, interval):
     ts = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
     outfile = os.path.join(out_dir, f"rpt_1005_bandwidth_{ts}.xlsx")
 
-    wb = openpyxl.Workbook()
+    # write-only: rows are streamed to the file instead of kept as a cell model
+    wb = openpyxl.Workbook(write_only=True)
+    _add_data_styles(wb)
 
-    thin = Side(border_style="thin", color="999999")
-    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    series = _query_interfaces_timeseries(device, interfaces, start, end, interval)
 
-    fill_header = PatternFill("solid", fgColor="DCE6F7")
-    fill_altrow = PatternFill("solid", fgColor="F7FAFF")
-
-    # Remove default sheet
-    if "Sheet" in wb.sheetnames:
-        wb.remove(wb["Sheet"])
+    # Convert selected time to IST
+    start_ist = datetime.fromisoformat(start.replace("Z", "+00:00")).astimezone(IST)
+    end_ist   = datetime.fromisoformat(end.replace("Z", "+00:00")).astimezone(IST)
+    time_range = f"Time Range: {start_ist.strftime('%Y-%m-%d %H:%M:%S IST')} → {end_ist.strftime('%Y-%m-%d %H:%M:%S IST')}"
 
     # =====================================================
     #              PER-INTERFACE SHEETS
@@ -44,90 +87,52 @@ def build_excel(template_type, device, interfaces, start, end, interval):
         sheet_name = iface[:31] or f"iface_{idx+1}"
         ws = wb.create_sheet(title=sheet_name)
 
-        # --------------------- HEADER ----------------------
-        ws["A1"] = "Bandwidth Utilization Report"
-        ws["A1"].font = Font(size=14, bold=True)
-
-        ws["A3"] = f"Template Type: {template_type or '-'}"
-        ws["A4"] = f"Device: {device}"
-        ws["A5"] = f"Interface: {iface}"
-
-        # Convert selected time to IST
-        start_ist = datetime.fromisoformat(start.replace("Z", "+00:00")).astimezone(IST)
-        end_ist   = datetime.fromisoformat(end.replace("Z", "+00:00")).astimezone(IST)
-
-        ws["A6"] = f"Time Range: {start_ist.strftime('%Y-%m-%d %H:%M:%S IST')} → {end_ist.strftime('%Y-%m-%d %H:%M:%S IST')}"
-        ws["A7"] = f"Interval: {interval}"
-        ws["A8"] = "(All times shown in IST)"
+        # Fixed column widths – write-only sheets need them before the first row
+        for col in range(1, len(HEADERS) + 1):
+            ws.column_dimensions[get_column_letter(col)].width = 28
 
-        for r in range(1, 9):
-            ws[f"A{r}"].font = Font(bold=True)
+        # --------------------- HEADER ----------------------
+        ws.append([_bold_cell(ws, "Bandwidth Utilization Report", TITLE_FONT)])  # row 1
+        ws.append([])
+        ws.append([_bold_cell(ws, f"Template Type: {template_type or '-'}")])
+        ws.append([_bold_cell(ws, f"Device: {device}")])
+        ws.append([_bold_cell(ws, f"Interface: {iface}")])
+        ws.append([_bold_cell(ws, time_range)])
+        ws.append([_bold_cell(ws, f"Interval: {interval}")])
+        ws.append([_bold_cell(ws, "(All times shown in IST)")])                 # row 8
+        ws.append([])
 
         # ------------------- TABLE HEADERS -------------------
-        headers = [
-            "Time (IST)",
-            "Traffic Total (Volume)",
-            "Traffic Total (Speed)",
-            "Traffic In (Volume)",
-            "Traffic In (Speed)",
-            "Traffic Out (Volume)",
-            "Traffic Out (Speed)",
-        ]
-
-        header_row = 10
-
-        for col, h in enumerate(headers, start=1):
-            c = ws.cell(row=header_row, column=col, value=h)
-            c.font = Font(bold=True)
-            c.fill = fill_header
-            c.alignment = Alignment(horizontal="center")
-            c.border = border
-
-        # -------------------- FETCH DATA ---------------------
-        rows = _query_interface_timeseries(device, iface, start, end, interval)
-
-        row_ptr = header_row + 1
-        odd = False
-
-        for row in rows:
-            excel_dt = row["time"].replace(tzinfo=None) 
-
-            values = [
-                excel_dt,
-                _format_bytes(row["total_bytes"]),
-                _format_speed_kbps(row["total_kbps"]),
-                _format_bytes(row["in_bytes"]),
-                _format_speed_kbps(row["in_kbps"]),
-                _format_bytes(row["out_bytes"]),
-                _format_speed_kbps(row["out_kbps"]),
-            ]
-
-            for col, val in enumerate(values, start=1):
-                c = ws.cell(row=row_ptr, column=col, value=val)
-                c.border = border
-
-                if isinstance(val, datetime):
-                    c.number_format = "yyyy-mm-dd hh:mm:ss"
-
-                if odd:
-                    c.fill = fill_altrow
-
-                # align text / numbers
-                if col == 1:
-                    c.alignment = Alignment(horizontal="center")
-                else:
-                    c.alignment = Alignment(horizontal="center")
-
-            odd = not odd
-            row_ptr += 1
-
-        data_end_row = row_ptr - 1
-
-        # Auto column widths
-        for col in range(1, len(headers) + 1):
-            ws.column_dimensions[get_column_letter(col)].width = 28
+        header_cells = []
+        for h in HEADERS:                                                 # row 10
+            c = WriteOnlyCell(ws, value=h)
+            c.font = BOLD_FONT
+            c.fill = FILL_HEADER
+            c.alignment = CENTER
+            c.border = BORDER
+            header_cells.append(c)
+        ws.append(header_cells)
+
+        # ---------------------- DATA -------------------------
+        cols = series[iface]
+
+        rows = zip(
+            [t.replace(tzinfo=None) for t in cols["time"]],
+            *_format_table_columns(cols),
+        )
+        # the row's two styles are picked once: time cell + value cells
+        for (time_style, data_style), values in zip(
+            cycle((("time_odd", "data_odd"), ("time_even", "data_even"))), rows
+        ):
+            cells = []
+            style = time_style
+            for v in values:
+                c = WriteOnlyCell(ws, value=v)
+                c.style = style
+                cells.append(c)
+                style = data_style
+            ws.append(cells)
 
 
     wb.save(outfile)
     return outfile
-
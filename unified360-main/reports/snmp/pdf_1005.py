@@ -1,9 +1,9 @@
 import os
+import re
 import tempfile
 from datetime import datetime, timedelta, timezone
 
 import matplotlib.pyplot as plt
-import requests
 from flask import current_app
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import landscape, A4
@@ -19,12 +19,19 @@ from reportlab.platypus import (
     PageBreak,
 )
 
+from services import ops_cache
+from services.http_utils import influx_json, pooled_session
+
 # ==========================
 #   TIMEZONE DEFINITIONS
 # ==========================
 IST = timezone(timedelta(hours=5, minutes=30))
 UTC = timezone.utc
 
+# keep-alive pool for the Influx queries, shared by the PDF and Excel builders
+_SESSION = pooled_session(pool_connections=16, pool_maxsize=32, retries=2, backoff_factor=0.2)
+_TIMEOUT = (3, 30)  # connect, read
+
 # ==========================
 #   GROUPING INTERVAL MAP
 # ==========================
@@ -39,34 +46,137 @@ _INTERVAL_SECONDS = {
 # ==========================
 #     VALUE FORMATTERS
 # ==========================
+# unit ladders, built once: (threshold, divisor, bound formatter); the
+# divisors are powers of 1024, so one division equals repeated /1024
+_BYTE_STEPS = tuple(
+    (1024.0 ** (i + 1), 1024.0 ** i, f"{{:.1f}} {unit}".format)
+    for i, unit in enumerate(("B", "KB", "MB", "GB"))
+)
+_fmt_tb = "{:.1f} TB".format
+_fmt_kbps = "{:.2f} kb/s".format
+_fmt_mbps = "{:.2f} Mb/s".format
+_fmt_gbps = "{:.2f} Gb/s".format
+
+
 def _format_bytes(v):
     if v is None:
         return "0"
-    units = ["B", "KB", "MB", "GB", "TB"]
     size = float(v)
-    idx = 0
-    while size >= 1024 and idx < len(units) - 1:
-        size /= 1024.0
-        idx += 1
-    return f"{size:.1f} {units[idx]}"
+    for limit, div, fmt in _BYTE_STEPS:
+        if size < limit:
+            return fmt(size / div)
+    return _fmt_tb(size / 1099511627776.0)  # 1024 ** 4
 
 
 def _format_speed_kbps(v_kbps):
     if v_kbps is None:
         return "0"
-    units = ["kb/s", "Mb/s", "Gb/s"]
     size = float(v_kbps)
-    idx = 0
-    while size >= 1000 and idx < len(units) - 1:
-        size /= 1000.0
-        idx += 1
-    return f"{size:.2f} {units[idx]}"
+    if size < 1000:
+        return _fmt_kbps(size)
+    size /= 1000.0
+    if size < 1000:
+        return _fmt_mbps(size)
+    return _fmt_gbps(size / 1000.0)
+
+
+def _format_table_columns(cols):
+    """
+    The six volume/speed table columns, formatted once per column in
+    header order (total, in, out; volume then speed). Shared by the PDF
+    and Excel tables, which each add their own time column.
+    """
+    return (
+        list(map(_format_bytes, cols["total_bytes"])),
+        list(map(_format_speed_kbps, cols["total_kbps"])),
+        list(map(_format_bytes, cols["in_bytes"])),
+        list(map(_format_speed_kbps, cols["in_kbps"])),
+        list(map(_format_bytes, cols["out_bytes"])),
+        list(map(_format_speed_kbps, cols["out_kbps"])),
+    )
 
 
 # ==========================
 #        DATA FETCHER
 # ==========================
-def _query_interface_timeseries(device, iface, start_iso, end_iso, interval):
+# cached timeseries are shared between callers: treat them as read-only
+_TS_CACHE_TTL = 120
+# a window that ended in the past no longer changes; still kept short, a
+# series entry can be a few MB
+_TS_CACHE_TTL_CLOSED = 600
+
+
+def _ts_cache_ttl(end_iso):
+    try:
+        end = datetime.fromisoformat(end_iso.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return _TS_CACHE_TTL
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=UTC)
+    # allow a few minutes for late-arriving SNMP polls
+    if end < datetime.now(UTC) - timedelta(minutes=5):
+        return _TS_CACHE_TTL_CLOSED
+    return _TS_CACHE_TTL
+
+
+def _query_interfaces_timeseries(device, interfaces, start_iso, end_iso, interval):
+    """
+    Interface traffic columns for each of a device's interfaces:
+    {iface: columns}. Every interface is cached on its own in the shared
+    ops cache, so repeated windows (PDF then Excel, dashboard refreshes)
+    hit Influx once; the ones not cached are fetched in a single query.
+    """
+    out = {}
+    missing = []
+    for iface in dict.fromkeys(interfaces):
+        hit = ops_cache.series.get(_ts_cache_key(device, iface, start_iso, end_iso, interval))
+        if hit is None:
+            missing.append(iface)
+        else:
+            out[iface] = hit
+
+    if missing:
+        ttl = _ts_cache_ttl(end_iso)
+        fetched = _fetch_interfaces_timeseries(device, missing, start_iso, end_iso, interval)
+        for iface, cols in fetched.items():
+            ops_cache.series.set_value(
+                _ts_cache_key(device, iface, start_iso, end_iso, interval), cols, ttl_seconds=ttl
+            )
+        out.update(fetched)
+    return out
+
+
+def _ts_cache_key(device, iface, start_iso, end_iso, interval):
+    return f"rpt1005:ts:{device}:{iface}:{start_iso}:{end_iso}:{interval}"
+
+
+# column names of an interface series; every column has one entry per bucket
+_SERIES_COLUMNS = (
+    "time", "in_bytes", "out_bytes", "total_bytes", "in_kbps", "out_kbps", "total_kbps",
+)
+
+
+def _influx_str(s):
+    # body of a single-quoted InfluxQL string literal
+    return str(s).replace("\\", "\\\\").replace("'", "\\'")
+
+
+def _iface_condition(interfaces):
+    # one interface: exact tag match, no regex engine involved
+    if len(interfaces) == 1:
+        return f""""ifDescr" = '{_influx_str(interfaces[0])}'"""
+    # several: one anchored alternation of the escaped names
+    alt = "|".join(re.escape(i).replace("/", "\\/") for i in interfaces)
+    return f'"ifDescr" =~ /^({alt})$/'
+
+
+def _fetch_interfaces_timeseries(device, interfaces, start_iso, end_iso, interval):
+    """
+    One Influx query for all `interfaces`, grouped by ifDescr.
+    Returns {iface: columns}, each column-wise ({column: list}, see
+    _SERIES_COLUMNS) with "time" as IST datetimes; an interface without
+    data gets empty columns. Raises when the query fails.
+    """
     influx_url = current_app.config["INFLUXDB_URL"]
     influx_db = current_app.config["INFLUXDB_DB"]
 
@@ -77,65 +187,73 @@ def _query_interface_timeseries(device, iface, start_iso, end_iso, interval):
         non_negative_derivative(mean("ifInOctets"), {interval}) AS "in_deriv",
         non_negative_derivative(mean("ifOutOctets"), {interval}) AS "out_deriv"
     FROM "interface"
-    WHERE "hostname" = '{device}'
-      AND "ifDescr" =~ /{iface}/
+    WHERE "hostname" = '{_influx_str(device)}'
+      AND {_iface_condition(interfaces)}
       AND time >= '{start_iso}' AND time <= '{end_iso}'
-    GROUP BY time({interval}) fill(null)
+    GROUP BY time({interval}), "ifDescr" fill(null)
     """
 
-    resp = requests.get(influx_url, params={"db": influx_db, "q": q})
-    data = resp.json()
-
-    rows = []
-    series = data.get("results", [{}])[0].get("series", [])
-
-    if not series:
-        return rows
+    # epoch=s: bucket times come back as integers, not RFC3339 strings –
+    # a smaller payload that needs no date parsing
+    resp = _SESSION.get(
+        influx_url,
+        params={"db": influx_db, "q": q, "epoch": "s"},
+        timeout=_TIMEOUT,
+    )
+    # raises on HTTP/Influx errors: a failed query must not be cached as
+    # empty columns
+    data = influx_json(resp)
 
-    values = series[0].get("values", [])
+    out = {iface: _series_columns((), interval_sec) for iface in interfaces}
+    for s in data.get("results", [{}])[0].get("series", []):
+        iface = s.get("tags", {}).get("ifDescr")
+        if iface in out:
+            out[iface] = _series_columns(s.get("values", []), interval_sec)
+    return out
 
-    for r in values:
-        t_utc = datetime.fromisoformat(r[0].replace("Z", "+00:00")).astimezone(IST)
 
-        in_bytes = r[1] or 0
-        out_bytes = r[2] or 0
+def _series_columns(values, interval_sec):
+    if not values:
+        return {k: [] for k in _SERIES_COLUMNS}
 
-        total_bytes = in_bytes + out_bytes
+    # transpose once and compute column by column: v = [time, in_deriv, out_deriv]
+    t_raw, in_raw, out_raw = zip(*values)
 
-        in_kbps = (in_bytes * 8.0 / interval_sec) / 1000.0
-        out_kbps = (out_bytes * 8.0 / interval_sec) / 1000.0
-        total_kbps = in_kbps + out_kbps
+    fromts = datetime.fromtimestamp
+    times = [fromts(t, IST) for t in t_raw]     # <-- IST datetime objects
+    in_bytes = [x or 0 for x in in_raw]
+    out_bytes = [x or 0 for x in out_raw]
+    total_bytes = [i + o for i, o in zip(in_bytes, out_bytes)]
 
-        rows.append(
-            {
-                "time": t_utc,        # <-- IST datetime object
-                "in_bytes": in_bytes,
-                "out_bytes": out_bytes,
-                "total_bytes": total_bytes,
-                "in_kbps": in_kbps,
-                "out_kbps": out_kbps,
-                "total_kbps": total_kbps,
-            }
-        )
+    # bytes per bucket -> kb/s
+    to_kbps = 8.0 / interval_sec / 1000.0
+    in_kbps = [x * to_kbps for x in in_bytes]
+    out_kbps = [x * to_kbps for x in out_bytes]
+    total_kbps = [i + o for i, o in zip(in_kbps, out_kbps)]
 
-    return rows
+    return {
+        "time": times,
+        "in_bytes": in_bytes,
+        "out_bytes": out_bytes,
+        "total_bytes": total_bytes,
+        "in_kbps": in_kbps,
+        "out_kbps": out_kbps,
+        "total_kbps": total_kbps,
+    }
 
 
 # ==========================
 #      SPEED CHART
 # ==========================
-def _build_speed_chart(rows, device, iface, interval):
-    if not rows:
+def _build_speed_chart(cols, device, iface, interval):
+    if not cols["time"]:
         return None
 
-    times = [r["time"] for r in rows]  # already IST
-    ins = [r["in_kbps"] for r in rows]
-    outs = [r["out_kbps"] for r in rows]
-
     fig, ax = plt.subplots(figsize=(9, 2.6))
 
-    ax.plot(times, ins, label="Traffic In (kb/s)", linewidth=1.1)
-    ax.plot(times, outs, label="Traffic Out (kb/s)", linewidth=1.1)
+    # the columns go to matplotlib as-is (times already IST)
+    ax.plot(cols["time"], cols["in_kbps"], label="Traffic In (kb/s)", linewidth=1.1)
+    ax.plot(cols["time"], cols["out_kbps"], label="Traffic Out (kb/s)", linewidth=1.1)
 
     ax.set_title(f"{device} / {iface} – In/Out Speed ({interval})", fontsize=9)
     ax.set_ylabel("kb/s", fontsize=8)
@@ -236,13 +354,12 @@ def _add_header(story, template_type, device, interfaces, start_iso, end_iso, in
 # ==========================
 #      SUMMARY ROW
 # ==========================
-def _summary_row(rows):
-    if not rows:
+def _summary_row(cols):
+    speeds = cols["total_kbps"]
+    vols = cols["total_bytes"]
+    if not speeds:
         return {"min": 0, "max": 0, "avg": 0, "total_vol": 0}
 
-    speeds = [r["total_kbps"] for r in rows]
-    vols = [r["total_bytes"] for r in rows]
-
     return {
         "min": min(speeds),
         "max": max(speeds),
@@ -283,10 +400,12 @@ def build_pdf(template_type, device, interfaces, start, end, interval):
     # Header once on first page
     _add_header(story, template_type, device, interfaces, start, end, interval)
 
+    series = _query_interfaces_timeseries(device, interfaces, start, end, interval)
+
     first = True
 
     for iface in interfaces:
-        rows = _query_interface_timeseries(device, iface, start, end, interval)
+        cols = series[iface]
 
         if not first:
             story.append(PageBreak())
@@ -298,7 +417,7 @@ def build_pdf(template_type, device, interfaces, start, end, interval):
         story.append(Spacer(1, 3 * mm))
 
         # Summary bar
-        s = _summary_row(rows)
+        s = _summary_row(cols)
 
         summary_data = [
             [
@@ -334,7 +453,7 @@ def build_pdf(template_type, device, interfaces, start, end, interval):
         story.append(Spacer(1, 5 * mm))
 
         # Add traffic chart
-        chart_path = _build_speed_chart(rows, device, iface, interval)
+        chart_path = _build_speed_chart(cols, device, iface, interval)
         if chart_path:
             story.append(Image(chart_path, width=250 * mm, height=60 * mm))
             story.append(Spacer(1, 5 * mm))
@@ -352,20 +471,13 @@ def build_pdf(template_type, device, interfaces, start, end, interval):
             ]
         ]
 
-        for r in rows:
-            ts_str = r["time"].strftime("%Y-%m-%d %H:%M:%S")
-
-            table_data.append(
-                [
-                    ts_str,
-                    _format_bytes(r["total_bytes"]),
-                    _format_speed_kbps(r["total_kbps"]),
-                    _format_bytes(r["in_bytes"]),
-                    _format_speed_kbps(r["in_kbps"]),
-                    _format_bytes(r["out_bytes"]),
-                    _format_speed_kbps(r["out_kbps"]),
-                ]
+        # formatted column by column, zipped into rows
+        table_data.extend(
+            zip(
+                [t.strftime("%Y-%m-%d %H:%M:%S") for t in cols["time"]],
+                *_format_table_columns(cols),
             )
+        )
 
         tbl = Table(table_data, repeatRows=1)
 
@@ -2,6 +2,74 @@ import time
 from typing import Any, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # optional fast decoder; stdlib json is the fallback
+    orjson = None
+
+
+def pooled_session(
+    pool_connections: int = 8,
+    pool_maxsize: int = 16,
+    retries: int = 0,
+    backoff_factor: float = 0.0,
+) -> requests.Session:
+    """
+    Session with a keep-alive connection pool for http and https.
+    Meant to be created once per module and reused across calls.
+    `retries` > 0 retries connection/read failures with backoff.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(total=retries, backoff_factor=backoff_factor) if retries else 0,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def response_json(resp):
+    """
+    Decode a requests response body as JSON.
+    Uses orjson when installed (much faster on large Influx/Prometheus payloads).
+    """
+    if orjson is not None:
+        return orjson.loads(resp.content)
+    return resp.json()
+
+
+def influx_json(resp):
+    """
+    Decode an InfluxDB 1.x /query response.
+    Raises on an HTTP error status or an `error` in the body (whole request
+    or any statement), so callers never mistake a failed query for "no data".
+    """
+    resp.raise_for_status()
+    data = response_json(resp)
+    if data.get("error"):
+        raise RuntimeError(f"InfluxDB query failed: {data['error']}")
+    for result in data.get("results", ()):
+        if result.get("error"):
+            raise RuntimeError(f"InfluxDB query failed: {result['error']}")
+    return data
+
+
+def prometheus_json(resp):
+    """
+    Decode a Prometheus HTTP API response.
+    Raises on an HTTP error status or a non-"success" status in the body
+    (Prometheus sends JSON error bodies with its 4xx/5xx responses).
+    """
+    resp.raise_for_status()
+    data = response_json(resp)
+    if data.get("status") != "success":
+        raise RuntimeError(f"Prometheus query failed: {data.get('error') or data.get('status')}")
+    return data
 
 
 def get_json_with_retry(
@@ -23,7 +91,7 @@ def get_json_with_retry(
         try:
             resp = caller.get(url, params=params, timeout=timeout)
             resp.raise_for_status()
-            return resp.json()
+            return response_json(resp)
         except Exception as e:
             last_exc = e
             if i < retries:
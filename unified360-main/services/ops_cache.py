@@ -2,48 +2,79 @@ from datetime import datetime, timedelta, timezone
 from threading import Lock
 
 
-_CACHE = {}
-_LOCK = Lock()
-
-
 def _now():
     return datetime.now(timezone.utc)
 
 
-def get(key):
-    with _LOCK:
-        row = _CACHE.get(key)
-        if not row:
-            return None
-        if row["expires_at"] <= _now():
-            _CACHE.pop(key, None)
-            return None
-        return row["value"]
-
-
-def set_value(key, value, ttl_seconds=30):
-    ttl = max(1, int(ttl_seconds or 30))
-    with _LOCK:
-        _CACHE[key] = {
-            "value": value,
-            "expires_at": _now() + timedelta(seconds=ttl),
-        }
-
-
-def cached(key, ttl_seconds, builder):
-    hit = get(key)
-    if hit is not None:
-        return hit
-    value = builder()
-    set_value(key, value, ttl_seconds=ttl_seconds)
-    return value
-
-
-def invalidate(prefix=None):
-    with _LOCK:
-        if not prefix:
-            _CACHE.clear()
-            return
-        for k in list(_CACHE.keys()):
-            if str(k).startswith(prefix):
-                _CACHE.pop(k, None)
+class TTLCache:
+    """
+    Process-wide TTL cache bounded by entry count; once full, expired rows
+    are dropped first, then the least recently used.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._cache = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            row = self._cache.get(key)
+            if not row:
+                return None
+            if row["expires_at"] <= _now():
+                self._cache.pop(key, None)
+                return None
+            # re-insert: dict order doubles as the LRU order
+            self._cache[key] = self._cache.pop(key)
+            return row["value"]
+
+    def set_value(self, key, value, ttl_seconds=30):
+        ttl = max(1, int(ttl_seconds or 30))
+        with self._lock:
+            self._cache.pop(key, None)
+            self._cache[key] = {
+                "value": value,
+                "expires_at": _now() + timedelta(seconds=ttl),
+            }
+            if len(self._cache) > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        # caller holds the lock: drop expired rows, then the least recently used
+        now = _now()
+        for k in [k for k, row in self._cache.items() if row["expires_at"] <= now]:
+            del self._cache[k]
+        while len(self._cache) > self.max_entries:
+            del self._cache[next(iter(self._cache))]
+
+    def cached(self, key, ttl_seconds, builder):
+        hit = self.get(key)
+        if hit is not None:
+            return hit
+        value = builder()
+        self.set_value(key, value, ttl_seconds=ttl_seconds)
+        return value
+
+    def invalidate(self, prefix=None):
+        with self._lock:
+            if not prefix:
+                self._cache.clear()
+                return
+            for k in list(self._cache.keys()):
+                if str(k).startswith(prefix):
+                    self._cache.pop(k, None)
+
+
+# small lookups (copilot/itom state, inventories, per-host summaries)
+_DEFAULT = TTLCache(max_entries=1024)
+
+# report timeseries (SNMP / ping / port), kept apart from the small entries:
+# one entry is a whole series, up to ~2.5 MB (a year of hourly ping buckets,
+# or 5000 port buckets), so 16 entries bound this cache to ~40 MB per worker
+series = TTLCache(max_entries=16)
+
+get = _DEFAULT.get
+set_value = _DEFAULT.set_value
+cached = _DEFAULT.cached
+invalidate = _DEFAULT.invalidate
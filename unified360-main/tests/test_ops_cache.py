@@ -0,0 +1,48 @@
+from services import ops_cache
+
+
+def test_evicts_least_recently_used():
+    cache = ops_cache.TTLCache(max_entries=2)
+    cache.set_value("a", 1, ttl_seconds=60)
+    cache.set_value("b", 2, ttl_seconds=60)
+    assert cache.get("a") == 1  # "a" is now the most recently used
+    cache.set_value("c", 3, ttl_seconds=60)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_expired_entries_go_before_live_ones():
+    cache = ops_cache.TTLCache(max_entries=2)
+    cache.set_value("old", 1, ttl_seconds=60)
+    cache.set_value("stale", 2, ttl_seconds=60)
+    cache._cache["stale"]["expires_at"] = ops_cache._now()
+    cache.set_value("new", 3, ttl_seconds=60)
+
+    assert cache.get("old") == 1
+    assert cache.get("new") == 3
+    assert "stale" not in cache._cache
+
+
+def test_cached_builds_once():
+    cache = ops_cache.TTLCache(max_entries=8)
+    calls = []
+
+    def build():
+        calls.append(1)
+        return {"rows": []}
+
+    assert cache.cached("k", 60, build) == {"rows": []}
+    assert cache.cached("k", 60, build) == {"rows": []}
+    assert len(calls) == 1
+
+
+def test_series_cache_is_separate_and_small():
+    ops_cache.series.set_value("series-k", [1, 2, 3], ttl_seconds=60)
+    try:
+        assert ops_cache.get("series-k") is None
+        assert ops_cache.series.get("series-k") == [1, 2, 3]
+        assert ops_cache.series.max_entries <= 32
+    finally:
+        ops_cache.series.invalidate("series-k")
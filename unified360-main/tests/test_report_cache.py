@@ -0,0 +1,53 @@
+import os
+
+from reports.server import _report_cache
+
+
+def _publish(path, data):
+    # builders write a .part file and swap it in, never rewrite in place
+    tmp = str(path) + ".part"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def test_report_key_is_stable_and_versioned(monkeypatch):
+    rows = [{"instance": "a", "availability": 99.5}]
+    key = _report_cache.report_key("1001-pdf", "2026-01-01", rows)
+    assert key == _report_cache.report_key("1001-pdf", "2026-01-01", [dict(rows[0])])
+    assert key != _report_cache.report_key("1001-excel", "2026-01-01", rows)
+
+    monkeypatch.setattr(_report_cache, "CACHE_VERSION", _report_cache.CACHE_VERSION + 1)
+    assert key != _report_cache.report_key("1001-pdf", "2026-01-01", rows)
+
+
+def test_store_then_restore_republishes(tmp_path):
+    out = tmp_path / "Report.pdf"
+    key = _report_cache.report_key("t", 1)
+
+    assert not _report_cache.restore(str(out), key)
+
+    _publish(out, b"first build")
+    _report_cache.store(str(out), key)
+    _publish(out, b"another report")
+
+    assert _report_cache.restore(str(out), key)
+    assert out.read_bytes() == b"first build"
+    # restoring over the already-published copy leaves no .part behind
+    assert _report_cache.restore(str(out), key)
+    assert out.read_bytes() == b"first build"
+    assert not os.path.exists(str(out) + ".part")
+
+
+def test_store_prunes_oldest_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(_report_cache, "_MAX_ENTRIES", 2)
+    out = tmp_path / "Report.xlsx"
+    for i in range(4):
+        _publish(out, str(i).encode())
+        key = _report_cache.report_key("t", i)
+        _report_cache.store(str(out), key)
+        # distinct, increasing mtimes regardless of clock resolution
+        os.utime(_report_cache._cache_path(str(out), key), (i, i))
+
+    kept = sorted(p.read_bytes() for p in (tmp_path / ".cache").iterdir())
+    assert kept == [b"2", b"3"]
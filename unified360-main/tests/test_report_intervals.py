@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+
+from reports.port import rpt_1007
+
+
+def _interval(**delta):
+    start = datetime(2026, 1, 1)
+    return rpt_1007._choose_interval(start, start + timedelta(**delta))
+
+
+def test_short_ranges_keep_fixed_intervals():
+    assert _interval(hours=24) == "1m"
+    assert _interval(hours=72) == "5m"
+    assert _interval(days=15) == "30m"
+
+
+def test_long_ranges_escalate_to_stay_under_max_buckets():
+    assert _interval(days=30) == "1h"      # 720 buckets
+    assert _interval(days=300) == "6h"     # 7200 hourly buckets is too many
+    assert _interval(days=2000) == "1d"
+    assert _interval(days=40000) == "7d"
+    assert _interval(days=400000) == "7d"  # coarsest interval is the ceiling
+
+    for days in (16, 200, 3000, 30000):
+        interval = _interval(days=days)
+        seconds = dict(rpt_1007._COARSE_INTERVALS)[interval]
+        assert days * 86400 / seconds <= rpt_1007.MAX_BUCKETS
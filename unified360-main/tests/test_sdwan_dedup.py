@@ -0,0 +1,33 @@
+from reports.fortigate import rpt_1009
+
+
+def _row(name, time, latency=0.0, ifname="", hostname="fgt"):
+    return {"link_name": name, "ifname": ifname, "hostname": hostname,
+            "time": time, "latency_ms": latency}
+
+
+def test_time_key_orders_fractional_rfc3339_chronologically():
+    whole = "2026-01-01T00:00:00Z"
+    frac = "2026-01-01T00:00:00.5Z"
+    assert whole >= frac  # as text the older timestamp sorts last
+    assert rpt_1009._time_key(whole) < rpt_1009._time_key(frac)
+    assert rpt_1009._time_key("") == float("-inf")
+
+
+def test_latest_per_link_keeps_newest_row():
+    rows = [
+        _row("wan1", "2026-01-01T00:00:00.5Z", latency=2.0),
+        _row("wan1", "2026-01-01T00:00:00Z", latency=1.0),
+        _row("wan2", "2026-01-01T00:00:00Z", latency=5.0),
+        _row("", "2026-01-01T00:00:01Z", ifname="port3"),
+    ]
+    out = rpt_1009._latest_per_link(rows)
+
+    assert [r["link_name"] or r["ifname"] for r in out] == ["wan1", "wan2", "port3"]
+    assert out[0]["latency_ms"] == 2.0
+
+
+def test_latest_per_link_ties_keep_later_row():
+    rows = [_row("wan1", "2026-01-01T00:00:00Z", latency=1.0),
+            _row("wan1", "2026-01-01T00:00:00Z", latency=3.0)]
+    assert rpt_1009._latest_per_link(rows)[0]["latency_ms"] == 3.0
@@ -0,0 +1,55 @@
+import math
+import re
+
+from reports.server import _promql, rpt_1002
+
+
+def _promql_unquote(s):
+    # what Prometheus sees inside the double-quoted selector string
+    return s.replace("\\\\", "\\")
+
+
+def test_instance_regex_escapes_metacharacters():
+    insts = ["10.0.0.1:9100", "web(1)+a", "host|x", "db[2]*"]
+    regex = re.compile(_promql_unquote(_promql.instance_regex(insts)))
+
+    for inst in insts:
+        assert regex.fullmatch(inst)
+    # "." and "|" are literal, not wildcards / alternation
+    assert not regex.fullmatch("10x0x0x1:9100")
+    assert not regex.fullmatch("host")
+    assert not regex.fullmatch("x")
+
+
+def test_instance_regex_doubles_backslashes_for_promql_string():
+    assert _promql.instance_regex(["a.b"]) == "a\\\\.b"
+    assert _promql.instance_regex(["a", "b"]) == "a|b"
+
+
+def test_series_means_pools_samples_per_label():
+    series = [
+        {"metric": {"instance": "a", "device": "sda"}, "values": [[1, "1"], [2, "3"]]},
+        {"metric": {"instance": "a", "device": "sdb"}, "values": [[1, "5"], [2, "NaN"]]},
+        {"metric": {"instance": "b"}, "values": [[1, "2"]]},
+    ]
+    # all of a's non-NaN samples are averaged together: (1 + 3 + 5) / 3
+    assert rpt_1002._series_means(series, "instance") == {("a",): 3.0, ("b",): 2.0}
+
+
+def test_series_means_groups_by_several_labels_and_skips_missing():
+    series = [
+        {"metric": {"instance": "a", "mountpoint": "/"}, "values": [[1, "10"], [2, "20"]]},
+        {"metric": {"instance": "a", "mountpoint": "/var"}, "values": [[1, "40"]]},
+        {"metric": {"instance": "b"}, "values": [[1, "99"]]},
+        {"metric": {"instance": "c", "mountpoint": "/"}, "values": [[1, "NaN"]]},
+    ]
+    means = rpt_1002._series_means(series, "instance", "mountpoint")
+    assert means == {("a", "/"): 15.0, ("a", "/var"): 40.0}
+
+
+def test_series_means_empty():
+    assert rpt_1002._series_means([], "instance") == {}
+    means = rpt_1002._series_means(
+        [{"metric": {"instance": "a"}, "values": [[1, "+Inf"]]}], "instance"
+    )
+    assert math.isinf(means[("a",)])